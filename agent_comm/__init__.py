@@ -21,7 +21,8 @@ __all__ = [
     'agent_comm_tool',
 ]
 
-def agent_comm_tool(agent_id: str = None, message: str = None, action: str = "communicate"):
+def agent_comm_tool(agent_id: str = None, message: str = None, action: str = "communicate",
+                    wait: float = 0):
     """
     Main entry point for agent communication tool with MCP parameters
     
@@ -29,6 +30,7 @@ def agent_comm_tool(agent_id: str = None, message: str = None, action: str = "co
         agent_id: ID of the calling agent
         message: Message content to send
         action: Action to perform (send_message, check_messages, communicate)
+        wait: For check_messages, seconds to wait for a message when none is pending
     """
     try:
         from .engine import handle_send_message, handle_check_messages, handle_interactive_communication
@@ -37,7 +39,7 @@ def agent_comm_tool(agent_id: str = None, message: str = None, action: str = "co
         if action == "send_message" and agent_id and message:
             return handle_send_message(agent_id, message)
         elif action == "check_messages" and agent_id:
-            return handle_check_messages(agent_id)
+            return handle_check_messages(agent_id, wait)
         else:
             # Default: interactive communication
             return handle_interactive_communication(agent_id, message)
@@ -539,7 +539,7 @@ def get_flow_status() -> str:
             status_lines.append("Message Queue:")
             for msg in data["message_queue"]:
                 from_agent = msg.get("from_agent", "unknown")
-                delivered = "✓" if msg.get("delivered", False) else "⏳"
+                delivered = "✓" if msg.get("delivered_all", False) else "⏳"
                 message_preview = msg.get("message", "")[:50]
                 status_lines.append(f"  {delivered} From {from_agent}: {message_preview}...")
         
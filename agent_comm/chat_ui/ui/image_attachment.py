@@ -283,8 +283,19 @@ class ImageAttachmentWidget(QtWidgets.QWidget):
     def image_to_base64(self, image_path):
         """Convert image file to base64 string"""
         try:
-            with open(image_path, 'rb') as img_file:
-                return base64.b64encode(img_file.read()).decode('utf-8')
+            # Read into a single preallocated buffer to avoid intermediate bytes copies
+            size = os.stat(image_path).st_size
+            buf = bytearray(size)
+            offset = 0
+            with open(image_path, 'rb', buffering=0) as img_file, memoryview(buf) as view:
+                while offset < size:
+                    read = img_file.readinto(view[offset:])
+                    if not read:
+                        break
+                    offset += read
+            if offset < size:
+                del buf[offset:]
+            return base64.b64encode(buf).decode('ascii')
         except Exception as e:
             return None
     
@@ -613,8 +624,21 @@ class ImageAttachmentWidget(QtWidgets.QWidget):
             ))
     
     def get_attached_images(self):
-        """Return list of attached images"""
-        return self.attached_images
+        """Return list of attached images, encoding base64 data on demand
+
+        Images whose data can no longer be read (e.g. the database copy was
+        deleted) are left out, as they were when restoring encoded eagerly.
+        """
+        images = []
+        for img in self.attached_images:
+            if not img.get("base64_data") and img.get("path"):
+                # Restored images are encoded lazily from the database copy
+                base64_data = self.image_to_base64(img["path"])
+                if not base64_data:
+                    continue
+                img["base64_data"] = base64_data
+            images.append(img)
+        return images
     
     def save_images_to_config(self):
         """Save attached images to config if checkbox is checked"""
@@ -722,17 +746,11 @@ class ImageAttachmentWidget(QtWidgets.QWidget):
             # Copy image to database with original quality
             shutil.copy2(source_path, db_path)
             
-            # Verify database file exists before proceeding
-            if not os.path.exists(db_path):
-                self._hide_loading_state()
-                return False
-            
             # Convert to base64 from database copy
             base64_data = self.image_to_base64(db_path)
             if not base64_data:
                 # Clean up failed copy
-                if os.path.exists(db_path):
-                    os.remove(db_path)
+                Path(db_path).unlink(missing_ok=True)
                 self._hide_loading_state()
                 return False
             
@@ -744,7 +762,7 @@ class ImageAttachmentWidget(QtWidgets.QWidget):
                 "media_type": self.get_image_media_type(db_path),
                 "source_type": source_type,
                 "db_filename": db_filename,  # For database management (relative)
-                "relative_db_path": os.path.basename(db_path)  # SECURITY: Only relative path stored
+                "relative_db_path": db_filename  # SECURITY: Only relative path stored
             }
             
             self.attached_images.append(image_info)
@@ -777,13 +795,8 @@ class ImageAttachmentWidget(QtWidgets.QWidget):
                 return False
             
             # Remove physical file from database
-            if os.path.exists(db_path) and "user_images" in db_path:
-                os.remove(db_path)
-                
-                # Verify file is actually removed
-                if os.path.exists(db_path):
-                    self._hide_loading_state()
-                    return False
+            if "user_images" in db_path:
+                Path(db_path).unlink(missing_ok=True)
             
             # Hide loading state
             self._hide_loading_state()
@@ -863,23 +876,21 @@ class ImageAttachmentWidget(QtWidgets.QWidget):
             
             if db_path and os.path.exists(db_path):
                 try:
-                    # Convert to base64 from database
-                    base64_data = self.image_to_base64(db_path)
-                    if base64_data:
-                        # Restore full image info - SECURITY: No external paths stored
-                        image_info = {
-                            "path": db_path,
-                            "filename": img_data.get("filename", Path(db_path).name),
-                            "base64_data": base64_data,
-                            "media_type": img_data.get("media_type", "image/png"),
-                            "source_type": img_data.get("source_type", "attached"),
-                            "db_filename": img_data.get("db_filename"),
-                            "relative_db_path": img_data.get("relative_db_path", os.path.basename(db_path))
-                        }
-                        
-                        self.attached_images.append(image_info)
-                        self.add_image_preview(db_path)
-                        restored_count += 1
+                    db_name = Path(db_path).name
+                    # Restore image info only - base64 data is encoded on demand
+                    # in get_attached_images. SECURITY: No external paths stored
+                    image_info = {
+                        "path": db_path,
+                        "filename": img_data.get("filename", db_name),
+                        "media_type": img_data.get("media_type", "image/png"),
+                        "source_type": img_data.get("source_type", "attached"),
+                        "db_filename": img_data.get("db_filename"),
+                        "relative_db_path": img_data.get("relative_db_path", db_name)
+                    }
+                    
+                    self.attached_images.append(image_info)
+                    self.add_image_preview(db_path)
+                    restored_count += 1
                 except Exception as e:
                     pass
         
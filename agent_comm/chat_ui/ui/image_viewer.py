@@ -3,6 +3,7 @@ Advanced Image Viewer Component for AI Interaction Tool
 """
 
 import os
+from collections import OrderedDict
 from pathlib import Path
 from PyQt5 import QtWidgets, QtCore, QtGui
 
@@ -23,6 +24,30 @@ from .styles import (
     get_image_viewer_close_button_stylesheet
 )
 
+# Decoded pixmaps keyed by (path, mtime) so reopening an image skips decoding
+_PIXMAP_CACHE = OrderedDict()
+_PIXMAP_CACHE_MAX = 8
+
+
+def _load_pixmap(image_path):
+    """Load a QPixmap, reusing a recently decoded one when the file is unchanged"""
+    try:
+        key = (image_path, os.stat(image_path).st_mtime_ns)
+    except OSError:
+        return QtGui.QPixmap(image_path)
+    
+    pixmap = _PIXMAP_CACHE.get(key)
+    if pixmap is not None:
+        _PIXMAP_CACHE.move_to_end(key)
+        return pixmap
+    
+    pixmap = QtGui.QPixmap(image_path)
+    if not pixmap.isNull():
+        _PIXMAP_CACHE[key] = pixmap
+        if len(_PIXMAP_CACHE) > _PIXMAP_CACHE_MAX:
+            _PIXMAP_CACHE.popitem(last=False)
+    return pixmap
+
 
 class ImageViewerDialog(QtWidgets.QDialog):
     """Ultra-modern image viewer dialog with advanced zoom controls"""
@@ -193,7 +218,7 @@ class ImageViewerDialog(QtWidgets.QDialog):
         
     def setup_image(self):
         """Load and setup the image"""
-        self.original_pixmap = QtGui.QPixmap(self.image_path)
+        self.original_pixmap = _load_pixmap(self.image_path)
         if self.original_pixmap.isNull():
             self.image_label.setText(self._get_translation("image_viewer_unable_load"))
             self.zoom_out_btn.setEnabled(False)
@@ -248,13 +273,12 @@ class ImageViewerDialog(QtWidgets.QDialog):
         if self.original_pixmap.isNull():
             return
             
-        # Calculate new size
-        new_size = self.original_pixmap.size() * self.current_zoom
+        # Zoom is uniform, so scaling by width alone preserves the aspect ratio
+        new_width = max(1, int(self.original_pixmap.width() * self.current_zoom))
         
         # Scale image with high quality
-        scaled_pixmap = self.original_pixmap.scaled(
-            new_size,
-            QtCore.Qt.KeepAspectRatio,
+        scaled_pixmap = self.original_pixmap.scaledToWidth(
+            new_width,
             QtCore.Qt.SmoothTransformation
         )
         
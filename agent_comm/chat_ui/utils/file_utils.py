@@ -1,13 +1,19 @@
 # File utilities for AI Interaction Tool
 import os
-import sys
+import codecs
+import functools
+import mmap
 import unicodedata
 import re
 import stat
-import time
-from pathlib import Path
 from ..constants import SUPPORTED_ENCODINGS
 
+# Optional encoding detector - falls back to the candidate list below when missing
+try:
+    import charset_normalizer
+except ImportError:
+    charset_normalizer = None
+
 # Try to import size limits, but use None if not defined (no limits)
 try:
     from ..constants import MAX_FILE_SIZE_MB, MAX_ATTACHMENT_SIZE_MB
@@ -15,15 +21,82 @@ except ImportError:
     MAX_FILE_SIZE_MB = None
     MAX_ATTACHMENT_SIZE_MB = None
 
+# Byte order marks, longest first so UTF-32 is not mistaken for UTF-16
+_BOM_ENCODINGS = (
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+# Candidate encodings tried in order when no BOM is present; latin-1 maps every
+# byte, so it is the terminal fallback and nothing after it could ever be reached
+_FALLBACK_ENCODINGS = ('utf-8', 'latin-1')
+
+# Leading block inspected for NUL bytes before a file is read as text
+_BINARY_SNIFF_BYTES = 8192
+
+# BOMs of encodings where NUL bytes are expected in text
+_WIDE_BOMS = (codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE, codecs.BOM_UTF32_BE)
+
+# Files larger than this are memory-mapped instead of read into a bytes buffer
+_MMAP_THRESHOLD_BYTES = 1024 * 1024
+
+# Bytes handed to charset_normalizer when the file is memory-mapped
+_DETECTION_SAMPLE_BYTES = 64 * 1024
+
+# Encodings whose newline is not a single 0x0A byte
+_WIDE_ENCODING_PREFIXES = ('utf-16', 'utf-32')
+
+# Control characters stripped from paths (tab, newline and carriage return are kept)
+_CONTROL_CHARS_RE = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+# Owner permission bit matching each os.access mode
+_OWNER_MODE_BITS = {
+    os.R_OK: stat.S_IRUSR,
+    os.W_OK: stat.S_IWUSR,
+    os.X_OK: stat.S_IXUSR,
+}
+
+def _has_access(stat_info, path, mode):
+    """Kiểm tra quyền truy cập từ stat mode, fallback sang os.access khi không chắc chắn"""
+    geteuid = getattr(os, "geteuid", None)
+    if geteuid is not None:
+        euid = geteuid()
+        # Owner bits are authoritative for the owner; root and other users need os.access
+        if euid != 0 and stat_info.st_uid == euid:
+            return bool(stat_info.st_mode & _OWNER_MODE_BITS[mode])
+    return os.access(path, mode)
+
+@functools.lru_cache(maxsize=64)
+def _workspace_basename(workspace_path):
+    """Tên workspace (cached vì workspace thường cố định giữa các lần validate)"""
+    return os.path.basename(os.path.normpath(workspace_path))
+
+@functools.lru_cache(maxsize=64)
+def _absolute_workspace_path(workspace_path):
+    return os.path.normpath(workspace_path)
+
+def _workspace_abspath(workspace_path):
+    """Absolute workspace path; only already-absolute paths are cached since others depend on cwd"""
+    if os.path.isabs(workspace_path):
+        return _absolute_workspace_path(workspace_path)
+    return os.path.abspath(workspace_path)
+
 def normalize_path_unicode(path):
     """Chuẩn hóa path với Unicode normalization"""
     if not path:
         return ""
     
     try:
-        normalized = unicodedata.normalize('NFC', str(path))
-        cleaned = ''.join(char for char in normalized if ord(char) >= 32 or char in '\t\n\r')
-        return cleaned
+        path_str = str(path)
+        # NFC is a no-op for ASCII, so only control characters need stripping
+        if path_str.isascii():
+            return _CONTROL_CHARS_RE.sub('', path_str)
+        
+        normalized = unicodedata.normalize('NFC', path_str)
+        return _CONTROL_CHARS_RE.sub('', normalized)
     except Exception:
         return str(path)
 
@@ -35,17 +108,21 @@ def validate_workspace_path(workspace_path):
     try:
         normalized_path = normalize_path_unicode(workspace_path)
         
-        if not os.path.exists(normalized_path):
+        try:
+            stat_info = os.stat(normalized_path)
+        except (FileNotFoundError, NotADirectoryError):
             return {"valid": False, "error": f"Workspace path does not exist: {normalized_path}"}
         
-        if not os.path.isdir(normalized_path):
+        if not stat.S_ISDIR(stat_info.st_mode):
             return {"valid": False, "error": f"Workspace path is not a directory: {normalized_path}"}
         
-        if not os.access(normalized_path, os.R_OK):
+        if not _has_access(stat_info, normalized_path, os.R_OK):
             return {"valid": False, "error": f"Cannot read workspace directory: {normalized_path}"}
         
         try:
-            list(os.listdir(normalized_path)[:1])
+            # Probe a single entry instead of listing the whole directory
+            with os.scandir(normalized_path) as entries:
+                next(entries, None)
         except PermissionError:
             return {"valid": False, "error": f"Permission denied for workspace: {normalized_path}"}
         except OSError as e:
@@ -66,12 +143,18 @@ def validate_file_path_in_workspace(file_path, workspace_path):
         normalized_workspace = normalize_path_unicode(workspace_path)
         
         abs_file = os.path.abspath(normalized_file)
-        abs_workspace = os.path.abspath(normalized_workspace)
+        abs_workspace = _workspace_abspath(normalized_workspace)
         
-        if not os.path.exists(abs_file):
+        # Single lstat (plus stat for symlink targets) instead of separate exists/isfile/isdir/islink calls
+        try:
+            stat_info = os.lstat(abs_file)
+            is_symlink = stat.S_ISLNK(stat_info.st_mode)
+            if is_symlink:
+                stat_info = os.stat(abs_file)
+        except (FileNotFoundError, NotADirectoryError):
             return {"valid": False, "error": f"File/folder does not exist: {normalized_file}"}
         
-        if not os.access(abs_file, os.R_OK):
+        if not _has_access(stat_info, abs_file, os.R_OK):
             return {"valid": False, "error": f"Cannot read file/folder: {normalized_file}"}
         
         try:
@@ -80,9 +163,8 @@ def validate_file_path_in_workspace(file_path, workspace_path):
         except ValueError:
             return {"valid": False, "error": f"Cannot calculate relative path"}
         
-        is_file = os.path.isfile(abs_file)
-        is_dir = os.path.isdir(abs_file)
-        is_symlink = os.path.islink(abs_file)
+        is_file = stat.S_ISREG(stat_info.st_mode)
+        is_dir = stat.S_ISDIR(stat_info.st_mode)
         
         return {
             "valid": True,
@@ -105,7 +187,7 @@ def create_relative_path_with_workspace(file_path, workspace_path):
             return None, validation["error"]
         
         relative_path = validation["relative_path"]
-        workspace_name = os.path.basename(os.path.normpath(workspace_path))
+        workspace_name = _workspace_basename(workspace_path)
         full_relative_path = f"{workspace_name}/{relative_path}"
         
         return full_relative_path, None
@@ -113,6 +195,58 @@ def create_relative_path_with_workspace(file_path, workspace_path):
     except Exception as e:
         return None, f"Error creating relative path: {str(e)}"
 
+def _utf16_without_bom(head):
+    """Guess BOM-less UTF-16 from where NUL bytes fall in the first block
+
+    The high byte of ASCII characters is NUL, so UTF-16 text has NULs on
+    one byte parity only, while binary data has them on both.
+    """
+    even = head[0::2].count(0)
+    odd = head[1::2].count(0)
+    if max(even, odd) < len(head) // 8 or min(even, odd) > max(even, odd) // 20:
+        return None
+    return 'utf-16-le' if odd > even else 'utf-16-be'
+
+def _looks_binary(head):
+    """Binary heuristic: NUL bytes in the first block, unless it looks like UTF-16/32 text"""
+    if head.startswith(_WIDE_BOMS) or b'\x00' not in head:
+        return False
+    return _utf16_without_bom(head) is None
+
+def _decode_text(raw):
+    """Decode a bytes-like buffer with BOM sniffing, returning (encoding, content) or (None, None)"""
+    head = bytes(raw[:4])
+    for bom, encoding in _BOM_ENCODINGS:
+        if head.startswith(bom):
+            return encoding, str(raw, encoding, 'replace')
+    
+    candidates = list(_FALLBACK_ENCODINGS)
+    if charset_normalizer is not None:
+        # charset_normalizer only accepts bytes, so memory-mapped files are sampled
+        sample = raw if isinstance(raw, bytes) else raw[:_DETECTION_SAMPLE_BYTES]
+        best = charset_normalizer.from_bytes(sample).best()
+        if best is not None:
+            candidates.insert(0, best.encoding)
+    
+    # NUL bytes that survived _looks_binary mean BOM-less UTF-16, which must be tried first
+    block = bytes(raw[:_BINARY_SNIFF_BYTES])
+    if b'\x00' in block:
+        wide = _utf16_without_bom(block)
+        if wide is not None:
+            candidates.insert(0, wide)
+    
+    for encoding in candidates:
+        try:
+            content = str(raw, encoding, 'replace')
+        except LookupError:
+            continue
+        
+        replacement_ratio = content.count('\ufffd') / max(len(content), 1)
+        if replacement_ratio < 0.1:
+            return encoding, content
+    
+    return None, None
+
 def read_file_content(file_path):
     """Đọc nội dung file với encoding detection"""        
     try:
@@ -129,25 +263,35 @@ def read_file_content(file_path):
         except OSError as e:
             return {"success": False, "error": f"Cannot get file size: {str(e)}"}
         
-        encodings = ['utf-8', 'utf-8-sig', 'utf-16', 'utf-16le', 'utf-16be', 
-                    'latin-1', 'cp1252', 'gb2312', 'gbk', 'shift_jis', 'euc-kr']
-        
-        for encoding in encodings:
-            try:
-                with open(normalized_path, 'r', encoding=encoding, errors='replace') as file:
-                    content = file.read()
-                    
-                replacement_ratio = content.count('\ufffd') / max(len(content), 1)
-                if replacement_ratio < 0.1:
-                    return {
-                        "success": True,
-                        "content": content,
-                        "encoding": encoding,
-                        "size": file_size,
-                        "lines": content.count('\n') + 1
-                    }
-            except Exception:
-                continue
+        # Read the bytes once and decode in memory instead of re-reading per encoding
+        with open(normalized_path, 'rb') as file:
+            # Reject binaries from the first block before touching the rest of the file
+            head = file.read(_BINARY_SNIFF_BYTES)
+            if _looks_binary(head):
+                encoding, content = None, None
+            elif file_size > _MMAP_THRESHOLD_BYTES:
+                # Large files are decoded straight from the mapping, skipping the read() copy
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as raw:
+                    encoding, content = _decode_text(raw)
+            else:
+                raw = head + file.read()
+                encoding, content = _decode_text(raw)
+        
+        if content is not None:
+            # Count newlines on the raw bytes unless the encoding is not ASCII-compatible
+            # (or the buffer was a now-closed mapping)
+            if isinstance(raw, bytes) and not encoding.startswith(_WIDE_ENCODING_PREFIXES):
+                lines = raw.count(b'\n') + 1
+            else:
+                lines = content.count('\n') + 1
+            
+            return {
+                "success": True,
+                "content": content,
+                "encoding": encoding,
+                "size": file_size,
+                "lines": lines
+            }
         
         # Nếu không đọc được text, return thông tin basic
         return {
@@ -166,16 +310,19 @@ def get_file_info_comprehensive(file_path):
     """Lấy thông tin file toàn diện"""
     try:
         normalized_path = normalize_path_unicode(file_path)
-        stat_info = os.stat(normalized_path)
+        # Derive type and permissions from the stat mode instead of separate checks
+        stat_info = os.lstat(normalized_path)
+        is_symlink = stat.S_ISLNK(stat_info.st_mode)
+        if is_symlink:
+            stat_info = os.stat(normalized_path)
         
-        is_file = os.path.isfile(normalized_path)
-        is_dir = os.path.isdir(normalized_path)
-        is_symlink = os.path.islink(normalized_path)
+        is_file = stat.S_ISREG(stat_info.st_mode)
+        is_dir = stat.S_ISDIR(stat_info.st_mode)
         
         permissions = {
-            "readable": os.access(normalized_path, os.R_OK),
-            "writable": os.access(normalized_path, os.W_OK),
-            "executable": os.access(normalized_path, os.X_OK)
+            "readable": _has_access(stat_info, normalized_path, os.R_OK),
+            "writable": _has_access(stat_info, normalized_path, os.W_OK),
+            "executable": _has_access(stat_info, normalized_path, os.X_OK)
         }
         
         extension = ""
@@ -212,15 +359,36 @@ def get_file_info_comprehensive(file_path):
     except Exception as e:
         return {"success": False, "error": str(e), "path": file_path}
 
+def scan_workspace(workspace_path):
+    """Liệt kê metadata các entry trong workspace bằng một lần os.scandir"""
+    normalized_path = normalize_path_unicode(workspace_path)
+    
+    with os.scandir(normalized_path) as entries:
+        for entry in entries:
+            # DirEntry caches type info from the directory read, so only size needs a stat
+            try:
+                size = entry.stat(follow_symlinks=False).st_size
+            except OSError:
+                size = 0
+            
+            yield {
+                "name": entry.name,
+                "path": entry.path,
+                "is_file": entry.is_file(follow_symlinks=False),
+                "is_dir": entry.is_dir(follow_symlinks=False),
+                "is_symlink": entry.is_symlink(),
+                "size": size
+            }
+
 # Backward compatibility functions
 def validate_file_path(file_path):
     try:
         normalized_path = normalize_path_unicode(file_path)
         
-        if not os.path.exists(normalized_path):
-            return {"valid": False, "error": f"Path does not exist: {normalized_path}"}
-        
+        # os.access is False for missing paths too, so exists only runs to pick the error message
         if not os.access(normalized_path, os.R_OK):
+            if not os.path.exists(normalized_path):
+                return {"valid": False, "error": f"Path does not exist: {normalized_path}"}
             return {"valid": False, "error": f"Path is not readable: {normalized_path}"}
         
         return {"valid": True, "normalized_path": normalized_path}
@@ -5,8 +5,28 @@ Handles conversion of base64 image data to MCP Image objects
 
 from mcp.server.fastmcp.utilities.types import Image as MCPImage
 import base64
-import sys
-from typing import List, Dict, Any
+import logging
+import re
+from typing import List, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Image format lookups by MIME subtype and by file extension
+_FORMAT_BY_SUBTYPE = {'jpeg': 'jpeg', 'jpg': 'jpeg', 'gif': 'gif', 'png': 'png'}
+_FORMAT_BY_EXTENSION = {'jpg': 'jpeg', 'jpeg': 'jpeg', 'gif': 'gif', 'png': 'png'}
+
+# Padded standard base64 with no whitespace, the form b64_decoded_size expects
+_BASE64_RE = re.compile(r'[A-Za-z0-9+/]*={0,2}')
+
+
+def _detect_format(media_type: str, filename: str) -> str:
+    """Determine image format from media_type, then filename extension, defaulting to PNG"""
+    _, _, subtype = media_type.partition('/')
+    image_format = _FORMAT_BY_SUBTYPE.get(subtype.lower())
+    if image_format is None:
+        _, dot, extension = filename.rpartition('.')
+        image_format = _FORMAT_BY_EXTENSION.get(extension.lower(), 'png') if dot else 'png'
+    return image_format
 
 
 def process_images(images_data: List[dict]) -> List[MCPImage]:
@@ -39,27 +59,31 @@ def process_images(images_data: List[dict]) -> List[MCPImage]:
                 continue
             
             # Determine format from media_type or filename
-            media_type = img.get("media_type", "image/png")
-            filename = img.get("filename", "image.png")
-            
-            if "jpeg" in media_type or "jpg" in media_type or filename.lower().endswith(('.jpg', '.jpeg')):
-                image_format = 'jpeg'
-            elif "gif" in media_type or filename.lower().endswith('.gif'):
-                image_format = 'gif'
-            else:
-                image_format = 'png'  # Default to PNG
+            image_format = _detect_format(img.get("media_type", "image/png"), img.get("filename", "image.png"))
             
             # Create MCPImage with raw bytes (NOT base64 string!)
             mcp_image = MCPImage(data=image_bytes, format=image_format)
             mcp_images.append(mcp_image)
             
         except Exception as e:
-            print(f"Error processing image {i}: {e}", file=sys.stderr)
+            logger.warning("Error processing image %d: %s", i, e)
             continue
     
     return mcp_images
 
 
+def _decode_or_none(image_data: dict) -> Optional[bytes]:
+    """Decode base64_data once, returning None if it is missing or malformed"""
+    base64_data = image_data.get("base64_data")
+    if not base64_data or not isinstance(base64_data, str):
+        return None
+    
+    try:
+        return base64.b64decode(base64_data)
+    except Exception:
+        return None
+
+
 def validate_image_data(image_data: dict) -> bool:
     """
     Validate if image data is properly formatted
@@ -70,30 +94,33 @@ def validate_image_data(image_data: dict) -> bool:
     Returns:
         bool: True if valid, False otherwise
     """
-    required_fields = ["base64_data"]
-    
-    for field in required_fields:
-        if field not in image_data or not image_data[field]:
-            return False
-    
-    # Check if base64_data is valid string
-    if not isinstance(image_data["base64_data"], str):
-        return False
+    return _decode_or_none(image_data) is not None
+
+
+def b64_decoded_size(base64_data: str) -> int:
+    """
+    Compute the decoded byte length of a base64 string without decoding it
     
-    try:
-        # Try to decode base64 to verify it's valid
-        base64.b64decode(image_data["base64_data"])
-        return True
-    except Exception:
-        return False
+    Args:
+        base64_data: Base64 encoded string (padded, no embedded whitespace)
+        
+    Returns:
+        int: Number of bytes the string decodes to
+    """
+    base64_data = base64_data.rstrip()
+    return (len(base64_data) * 3) // 4 - base64_data[-2:].count('=')
 
 
-def get_image_info(image_data: dict) -> Dict[str, Any]:
+def get_image_info(image_data: dict, decode: bool = True) -> Dict[str, Any]:
     """
     Extract detailed information about an image
     
     Args:
         image_data: Dictionary containing image information
+        decode: If False, size_bytes is computed from the base64 length and the
+            payload is not decoded; is_valid then only checks that base64_data
+            is non-empty, padded base64 (alphabet and length), not that it
+            holds an image
         
     Returns:
         Dict containing image metadata
@@ -106,24 +133,26 @@ def get_image_info(image_data: dict) -> Dict[str, Any]:
         "is_valid": False
     }
     
-    if validate_image_data(image_data):
+    if not decode:
+        base64_data = image_data.get("base64_data")
+        if (base64_data and isinstance(base64_data, str) and len(base64_data) % 4 == 0
+                and _BASE64_RE.fullmatch(base64_data)):
+            info["size_bytes"] = b64_decoded_size(base64_data)
+            info["is_valid"] = True
+            info["format"] = _detect_format(info["media_type"], info["filename"])
+        return info
+    
+    # Validate and measure from a single decode
+    image_bytes = _decode_or_none(image_data)
+    if image_bytes is not None:
         try:
-            image_bytes = base64.b64decode(image_data["base64_data"])
             info["size_bytes"] = len(image_bytes)
             info["is_valid"] = True
             
             # Determine format
-            media_type = info["media_type"]
-            filename = info["filename"]
-            
-            if "jpeg" in media_type or "jpg" in media_type or filename.lower().endswith(('.jpg', '.jpeg')):
-                info["format"] = 'jpeg'
-            elif "gif" in media_type or filename.lower().endswith('.gif'):
-                info["format"] = 'gif'
-            else:
-                info["format"] = 'png'
+            info["format"] = _detect_format(info["media_type"], info["filename"])
                 
         except Exception as e:
-            print(f"Error getting image info: {e}", file=sys.stderr)
+            logger.warning("Error getting image info: %s", e)
     
     return info 
\ No newline at end of file
@@ -16,6 +16,9 @@ PENDING_CALLS_FILE = SHARED_DATA_DIR / "pending_calls.json"
 AGENT_REGISTRY_FILE = SHARED_DATA_DIR / "agent_registry.json"
 CONFIG_FILE = SHARED_DATA_DIR / "config.json"
 
+# Messages trimmed from conversations.json, one JSONL file per conversation
+ARCHIVE_DIR = SHARED_DATA_DIR / "archive"
+
 # UI Configuration
 UI_TITLE = "Agent Communication Controller"
 UI_WIDTH = 1200  # Increased default size
@@ -25,9 +28,16 @@ UI_HEIGHT = 800
 MESSAGE_STATUS = {
     "PENDING": "pending",
     "DELIVERED": "delivered",
-    "READ": "read"
+    "READ": "read",
+    "DROPPED": "dropped"
 }
 
+# Conversation limits: past MAX_MESSAGES_PER_CONVERSATION the oldest half is
+# archived; new messages are refused while a recipient has MAX_PENDING_PER_AGENT
+# undelivered ones
+MAX_MESSAGES_PER_CONVERSATION = 1000
+MAX_PENDING_PER_AGENT = 200
+
 # Agent Types
 AGENT_TYPES = {
     "CLAUDE": "claude",
@@ -2,11 +2,34 @@
 Config Manager - Handles UI configuration persistence
 """
 
+import copy
 import json
+import os
 from pathlib import Path
 from typing import Dict, Any, Optional
 from ..constants import CONFIG_FILE, UI_WIDTH, UI_HEIGHT
 
+# orjson is optional; fall back to the stdlib encoder with identical output options
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Bump when default_config gains keys so older files are merged and rewritten once
+_SCHEMA_VERSION = 2
+
+
+def _loads(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    return json.dumps(obj, indent=2, ensure_ascii=False).encode('utf-8')
+
 
 class ConfigManager:
     """Manages configuration persistence for UI settings"""
@@ -23,9 +46,14 @@ class ConfigManager:
             "ui": {
                 "splitter_sizes": [480, 420, 350],  # Default 3-column layout - generous Message Queue
                 "auto_refresh_interval": 500
-            }
+            },
+            "_schema_version": _SCHEMA_VERSION
         }
         
+        # Parsed config cached until the file's mtime changes
+        self._cache: Optional[Dict[str, Any]] = None
+        self._cache_mtime = 0
+        
         # Ensure config file exists
         self._ensure_config_exists()
     
@@ -35,29 +63,50 @@ class ConfigManager:
             self.save_config(self.default_config)
     
     def load_config(self) -> Dict[str, Any]:
-        """Load configuration from file"""
+        """Load configuration from file, reusing the cached copy while the file is unchanged"""
+        return copy.deepcopy(self._cached_config())
+    
+    def _cached_config(self) -> Dict[str, Any]:
+        """Return the parsed config shared with other callers; it must only be read"""
         try:
-            with open(self.config_file, 'r', encoding='utf-8') as f:
-                config = json.load(f)
+            mtime = self.config_file.stat().st_mtime_ns
+            if self._cache is None or mtime != self._cache_mtime:
+                config = _loads(self.config_file.read_bytes())
                 
-            # Merge with defaults to ensure all keys exist
-            return self._merge_with_defaults(config)
+                if config.get("_schema_version") == _SCHEMA_VERSION:
+                    # Written by this schema, so every default key is already present
+                    self._cache = config
+                    self._cache_mtime = mtime
+                else:
+                    # Merge with defaults once and persist so later loads skip the merge
+                    self._cache = self._merge_with_defaults(config)
+                    self._cache_mtime = mtime
+                    self.save_config(self._cache)
             
-        except (FileNotFoundError, json.JSONDecodeError):
+            return self._cache
+            
+        except (FileNotFoundError, ValueError):
             # Return defaults if file missing or corrupted
-            return self.default_config.copy()
+            return self.default_config
     
     def save_config(self, config: Dict[str, Any]):
         """Save configuration to file"""
         try:
-            with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(config, f, indent=2, ensure_ascii=False)
+            # Write to a sibling temp file and rename so readers never see a torn file
+            tmp_file = self.config_file.with_suffix('.json.tmp')
+            full_config = self._merge_with_defaults(copy.deepcopy(config))
+            tmp_file.write_bytes(_dumps(full_config))
+            os.replace(tmp_file, self.config_file)
+            
+            # Keep the cache in sync so the next load does not re-read the file
+            self._cache = full_config
+            self._cache_mtime = self.config_file.stat().st_mtime_ns
         except Exception as e:
             print(f"Warning: Could not save config: {e}")
     
     def _merge_with_defaults(self, config: Dict[str, Any]) -> Dict[str, Any]:
         """Merge loaded config with defaults to ensure all keys exist"""
-        merged = self.default_config.copy()
+        merged = copy.deepcopy(self.default_config)
         
         # Recursively merge dictionaries
         for key, value in config.items():
@@ -66,12 +115,12 @@ class ConfigManager:
             else:
                 merged[key] = value
         
+        merged["_schema_version"] = _SCHEMA_VERSION
         return merged
     
     def get_window_geometry(self) -> Dict[str, int]:
         """Get window geometry settings"""
-        config = self.load_config()
-        return config["window"]
+        return dict(self._cached_config()["window"])
     
     def save_window_geometry(self, width: int, height: int, x: int, y: int):
         """Save window geometry settings"""
@@ -86,8 +135,7 @@ class ConfigManager:
     
     def get_splitter_sizes(self) -> list:
         """Get splitter sizes"""
-        config = self.load_config()
-        return config["ui"]["splitter_sizes"]
+        return list(self._cached_config()["ui"]["splitter_sizes"])
     
     def save_splitter_sizes(self, sizes: list):
         """Save splitter sizes"""
@@ -97,5 +145,4 @@ class ConfigManager:
     
     def get_refresh_interval(self) -> int:
         """Get auto refresh interval"""
-        config = self.load_config()
-        return config["ui"]["auto_refresh_interval"] 
\ No newline at end of file
+        return self._cached_config()["ui"]["auto_refresh_interval"] 
\ No newline at end of file
@@ -2,18 +2,111 @@
 Conversation Manager - Handles conversation flow and logic
 """
 
+import heapq
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from operator import itemgetter
 from typing import Dict, List, Any, Optional, Tuple
 from .state_manager import StateManager
 from .message_handler import MessageHandler
-from ..constants import MESSAGE_STATUS
+
+# orjson is optional; exports fall back to the stdlib encoder
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Maximum number of conversation summaries kept in memory
+SUMMARY_CACHE_SIZE = 1024
+
+# Line under the header of text exports
+EXPORT_SEPARATOR = "=" * 50
+
+_LAST_UPDATE_KEY = itemgetter("last_update")
+
+
+@dataclass(slots=True)
+class ConversationSummary:
+    """Compact form of a conversation summary, as held in the summary cache"""
+    conversation_id: str
+    participants: List[str]
+    created_at: Optional[str]
+    last_update: Optional[str]
+    total_messages: int
+    last_message: Optional[Dict[str, Any]]
+    pending_messages: int
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the summary as the dict shape exposed by ConversationManager
+
+        Mutable fields are copied so callers cannot change the cached summary.
+        """
+        return {
+            "conversation_id": self.conversation_id,
+            "participants": list(self.participants),
+            "created_at": self.created_at,
+            "last_update": self.last_update,
+            "total_messages": self.total_messages,
+            "last_message": dict(self.last_message) if self.last_message is not None else None,
+            "pending_messages": self.pending_messages
+        }
+
+
+# Lengths of datetime.isoformat() output without and with microseconds, no UTC offset
+_NAIVE_ISO_LENGTHS = (19, 26)
+
+
+def _parse_timestamp(value: str) -> Optional[datetime]:
+    """Parse an ISO-8601 timestamp into naive local time, or None if unparseable"""
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        # Python < 3.11 does not accept the 'Z' suffix
+        try:
+            parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+
+# Process-wide instances shared by every ConversationManager so their caches persist
+_state_manager: Optional[StateManager] = None
+_message_handler: Optional[MessageHandler] = None
+_singleton_lock = threading.Lock()
+
+
+def _get_state_manager() -> StateManager:
+    """Return the shared StateManager, creating it on first use"""
+    global _state_manager
+    if _state_manager is None:
+        with _singleton_lock:
+            if _state_manager is None:
+                _state_manager = StateManager()
+    return _state_manager
+
+
+def _get_message_handler() -> MessageHandler:
+    """Return the shared MessageHandler, creating it on first use"""
+    global _message_handler
+    if _message_handler is None:
+        with _singleton_lock:
+            if _message_handler is None:
+                _message_handler = MessageHandler()
+    return _message_handler
 
 
 class ConversationManager:
     """Manages conversation flow and multi-agent interactions"""
     
     def __init__(self):
-        self.state_manager = StateManager()
-        self.message_handler = MessageHandler()
+        self.state_manager = _get_state_manager()
+        self.message_handler = _get_message_handler()
+        self._summary_cache: "OrderedDict[tuple, ConversationSummary]" = OrderedDict()
     
     def start_conversation(self, agent1: str, agent2: str, initial_message: str = None) -> Tuple[bool, str]:
         """
@@ -55,43 +148,65 @@ class ConversationManager:
             if not conversation:
                 return False, {"error": f"Conversation {conv_id} not found"}
             
-            summary = {
-                "conversation_id": conv_id,
-                "participants": conversation.get("participants", []),
-                "created_at": conversation.get("created_at"),
-                "last_update": conversation.get("last_update"),
-                "total_messages": conversation.get("message_count", 0),
-                "last_message": None,
-                "pending_messages": 0
-            }
-            
-            messages = conversation.get("messages", [])
-            if messages:
-                last_msg = messages[-1]
-                summary["last_message"] = {
-                    "from": last_msg.get("from"),
-                    "content": last_msg.get("content", "")[:100] + "..." if len(last_msg.get("content", "")) > 100 else last_msg.get("content", ""),
-                    "timestamp": last_msg.get("timestamp")
-                }
-                
-                # Count pending message deliveries
-                pending_count = sum(
-                    1
-                    for msg in messages
-                    for status in msg.get("status", {}).values()
-                    if status == MESSAGE_STATUS["PENDING"]
-                )
-                summary["pending_messages"] = pending_count
-            
-            return True, summary
+            return True, self._build_summary(conv_id, conversation)
             
         except Exception as e:
             return False, {"error": f"Error getting conversation summary: {str(e)}"}
     
-    def get_all_conversations_summary(self) -> Tuple[bool, List[Dict[str, Any]]]:
+    def _build_summary(self, conv_id: str, conversation: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the summary of an already fetched conversation"""
+        # Summaries only change when messages are added or delivery status changes
+        cache_key = (
+            conv_id,
+            conversation.get("last_update"),
+            conversation.get("message_count", 0),
+            conversation.get("status_version", 0),
+        )
+        cached = self._summary_cache.get(cache_key)
+        if cached is not None:
+            self._summary_cache.move_to_end(cache_key)
+            return cached.to_dict()
+
+        last_message = None
+        pending_messages = 0
+
+        messages = conversation.get("messages", [])
+        if messages:
+            last_msg = messages[-1]
+            content = last_msg.get("content") or ""
+            last_message = {
+                "from": last_msg.get("from"),
+                "content": content[:100] + "..." if len(content) > 100 else content,
+                "timestamp": last_msg.get("timestamp")
+            }
+
+            # Pending deliveries come from the counters maintained on write
+            stats = self.state_manager.get_conversation_stats(conversation, conv_id)
+            pending_messages = sum(stats["pending"].values())
+
+        summary = ConversationSummary(
+            conversation_id=conv_id,
+            participants=conversation.get("participants", []),
+            created_at=conversation.get("created_at"),
+            last_update=conversation.get("last_update"),
+            total_messages=conversation.get("message_count", 0),
+            last_message=last_message,
+            pending_messages=pending_messages
+        )
+
+        self._summary_cache[cache_key] = summary
+        if len(self._summary_cache) > SUMMARY_CACHE_SIZE:
+            self._summary_cache.popitem(last=False)
+
+        return summary.to_dict()
+    
+    def get_all_conversations_summary(self, limit: Optional[int] = None) -> Tuple[bool, List[Dict[str, Any]]]:
         """
         Get summary of all conversations
         
+        Args:
+            limit: If given, only the ``limit`` most recently updated conversations are returned
+        
         Returns:
             Tuple of (success: bool, conversations_list: List[Dict])
         """
@@ -100,12 +215,13 @@ class ConversationManager:
             summaries = []
             
             for conv_id, conv_data in conversations.items():
-                success, summary = self.get_conversation_summary(conv_id)
-                if success:
-                    summaries.append(summary)
+                summaries.append(self._build_summary(conv_id, conv_data))
             
             # Sort by last update (most recent first)
-            summaries.sort(key=lambda x: x.get("last_update", ""), reverse=True)
+            if limit is not None:
+                summaries = heapq.nlargest(limit, summaries, key=_LAST_UPDATE_KEY)
+            else:
+                summaries.sort(key=_LAST_UPDATE_KEY, reverse=True)
             
             return True, summaries
             
@@ -125,8 +241,8 @@ class ConversationManager:
             if not agent_info:
                 return False, {"error": f"Agent {agent_id} not found"}
             
-            # Get all conversations
-            conversations = self.state_manager.get_all_conversations()
+            # Get per-agent counters for the agent's conversations
+            conversation_counts = self.state_manager.get_message_count_batch(agent_id)
             
             activity = {
                 "agent_id": agent_id,
@@ -141,37 +257,38 @@ class ConversationManager:
                 "active_conversations": []
             }
             
-            # Analyze conversations
-            for conv_id, conv_data in conversations.items():
-                participants = conv_data.get("participants", [])
-                
-                if agent_id in participants:
-                    activity["total_conversations"] += 1
-                    
-                    messages = conv_data.get("messages", [])
-                    sent_count = sum(1 for msg in messages if msg.get("from") == agent_id)
-                    received_count = sum(1 for msg in messages if agent_id in msg.get("status", {}))
-                    pending_count = sum(
-                        1 for msg in messages if msg.get("status", {}).get(agent_id) == MESSAGE_STATUS["PENDING"]
-                    )
-
-                    activity["total_messages_sent"] += sent_count
-                    activity["total_messages_received"] += received_count
-                    activity["pending_messages"] += pending_count
-
-                    # Add to active conversations if has recent activity
-                    if messages:  # Has messages
+            # Analyze conversations, accumulating in locals and storing totals once
+            sent = received = pending = 0
+            append_active = activity["active_conversations"].append
+            for conv_id, counts in conversation_counts.items():
+                sent += counts["sent"]
+                received += counts["received"]
+                pending += counts["pending"]
+
+                # Add to active conversations if has recent activity
+                message_count = counts["message_count"]
+                if message_count:  # Has messages
+                    participants = counts["participants"]
+                    if len(participants) == 2:
+                        # Common case: a direct conversation with one other agent
+                        other_participant = participants[1] if participants[0] == agent_id else participants[0]
+                    else:
                         other_participant = ", ".join([p for p in participants if p != agent_id])
-                        activity["active_conversations"].append({
-                            "conversation_id": conv_id,
-                            "with_agent": other_participant,
-                            "last_update": conv_data.get("last_update"),
-                            "message_count": len(messages),
-                            "pending_for_me": pending_count
-                        })
+                    append_active({
+                        "conversation_id": conv_id,
+                        "with_agent": other_participant,
+                        "last_update": counts["last_update"],
+                        "message_count": message_count,
+                        "pending_for_me": counts["pending"]
+                    })
+
+            activity["total_conversations"] = len(conversation_counts)
+            activity["total_messages_sent"] = sent
+            activity["total_messages_received"] = received
+            activity["pending_messages"] = pending
             
             # Sort active conversations by last update
-            activity["active_conversations"].sort(key=lambda x: x.get("last_update", ""), reverse=True)
+            activity["active_conversations"].sort(key=_LAST_UPDATE_KEY, reverse=True)
             
             return True, activity
             
@@ -186,23 +303,26 @@ class ConversationManager:
             Tuple of (success: bool, result_message: str)
         """
         try:
-            from datetime import datetime, timedelta
-            
             cutoff_date = datetime.now() - timedelta(days=days_old)
+            # last_update is written as datetime.now().isoformat(), the same format as
+            # the cutoff, so a string comparison orders them like datetimes
+            cutoff_str = cutoff_date.isoformat()
             conversations = self.state_manager.get_all_conversations()
             
             conversations_to_delete = []
             
             for conv_id, conv_data in conversations.items():
                 last_update_str = conv_data.get("last_update")
-                if last_update_str:
-                    try:
-                        last_update = datetime.fromisoformat(last_update_str.replace('Z', '+00:00'))
-                        if last_update < cutoff_date:
-                            conversations_to_delete.append(conv_id)
-                    except ValueError:
-                        # Skip if date parsing fails
-                        continue
+                if not last_update_str:
+                    continue
+                if len(last_update_str) in _NAIVE_ISO_LENGTHS:
+                    if last_update_str < cutoff_str:
+                        conversations_to_delete.append(conv_id)
+                    continue
+                # Timestamps written elsewhere may carry a 'Z' or UTC offset
+                last_update = _parse_timestamp(last_update_str)
+                if last_update is not None and last_update < cutoff_date:
+                    conversations_to_delete.append(conv_id)
             
             # Note: Actual deletion would require additional StateManager method
             # For now, just return info about what would be deleted
@@ -239,36 +359,29 @@ class ConversationManager:
     
     def _export_as_text(self, conversation: Dict[str, Any]) -> Tuple[bool, str]:
         """Export conversation as readable text"""
-        lines = []
-        
-        # Header
         participants = conversation.get("participants", [])
         created_at = conversation.get("created_at", "Unknown")
-        lines.append(f"Conversation between: {' and '.join(participants)}")
-        lines.append(f"Created: {created_at}")
-        lines.append("=" * 50)
-        lines.append("")
+        header = f"Conversation between: {' and '.join(participants)}\nCreated: {created_at}\n{EXPORT_SEPARATOR}\n"
         
-        # Messages
-        messages = conversation.get("messages", [])
-        for msg in messages:
-            from_agent = msg.get("from", "Unknown")
-            content = msg.get("content", "")
-            timestamp = msg.get("timestamp", "Unknown")
-            status_dict = msg.get("status", {})
-            status = ", ".join(f"{agent}:{state}" for agent, state in status_dict.items())
-
-            lines.append(f"[{timestamp}] {from_agent} ({status}):")
-            lines.append(f"  {content}")
-            lines.append("")
+        # One chunk per message, joined once
+        body = "".join([
+            f"\n[{msg.get('timestamp', 'Unknown')}] {msg.get('from', 'Unknown')} "
+            f"({', '.join(f'{agent}:{state}' for agent, state in msg.get('status', {}).items())}):\n"
+            f"  {msg.get('content', '')}\n"
+            for msg in conversation.get("messages", [])
+        ])
         
-        return True, "\n".join(lines)
+        return True, header + body
     
     def _export_as_json(self, conversation: Dict[str, Any]) -> Tuple[bool, str]:
         """Export conversation as JSON"""
-        import json
         try:
-            formatted_json = json.dumps(conversation, indent=2, ensure_ascii=False)
+            if orjson is not None:
+                formatted_json = orjson.dumps(
+                    conversation, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+                ).decode("utf-8")
+            else:
+                formatted_json = json.dumps(conversation, indent=2, ensure_ascii=False)
             return True, formatted_json
         except Exception as e:
             return False, f"Error formatting JSON: {str(e)}" 
\ No newline at end of file
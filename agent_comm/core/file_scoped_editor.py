@@ -1,6 +1,7 @@
 import logging
+import os
 from pathlib import Path
-from typing import Callable
+from typing import Callable, Optional, Tuple
 
 
 class FileScopedEditor:
@@ -14,10 +15,22 @@ class FileScopedEditor:
         self.file_path = Path(file_path).resolve()
         self.agent_id = agent_id
         self.logger = logging.getLogger("agent_comm.FileScopedEditor")
+        # (st_mtime_ns, st_size, content) of the last read or write
+        self._cache: Optional[Tuple[int, int, str]] = None
 
     def read(self) -> str:
-        """Return the entire content of the scoped file."""
-        content = self.file_path.read_text(encoding="utf-8")
+        """Return the entire content of the scoped file.
+
+        The decoded content is reused while the file's mtime and size are
+        unchanged.
+        """
+        st = self.file_path.stat()
+        cache = self._cache
+        if cache is not None and cache[0] == st.st_mtime_ns and cache[1] == st.st_size:
+            content = cache[2]
+        else:
+            content = self.file_path.read_text(encoding="utf-8")
+            self._cache = (st.st_mtime_ns, st.st_size, content)
         self.logger.info("[%s] read from %s", self.agent_id, self.file_path)
         return content
 
@@ -30,5 +43,43 @@ class FileScopedEditor:
         """
         original = self.read()
         updated = transform(original)
-        self.file_path.write_text(updated, encoding="utf-8")
+        self._write_atomic(updated)
+        # read_text() translates \r line endings, so only cache content it would return as-is
+        if "\r" in updated:
+            self._cache = None
+        else:
+            st = self.file_path.stat()
+            self._cache = (st.st_mtime_ns, st.st_size, updated)
         self.logger.info("[%s] wrote to %s", self.agent_id, self.file_path)
+
+    def _write_atomic(self, content: str) -> None:
+        """Write ``content`` to a sibling temp file and swap it into place.
+
+        Readers see either the old or the new file, never a partial write.
+        Newlines are translated like ``write_text`` and the original file
+        mode is kept.
+        """
+        if os.linesep != "\n":
+            content = content.replace("\n", os.linesep)
+        data = memoryview(content.encode("utf-8"))
+        mode = self.file_path.stat().st_mode & 0o7777
+        tmp_path = self.file_path.with_name(self.file_path.name + ".tmp")
+
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), mode)
+        try:
+            # The mode passed to os.open is masked by the umask
+            if hasattr(os, "fchmod"):
+                os.fchmod(fd, mode)
+            else:
+                os.chmod(tmp_path, mode)
+            while data:
+                written = os.write(fd, data)
+                data = data[written:]
+            # Flush to disk before the rename so a crash can't leave an empty file in place
+            os.fsync(fd)
+        except BaseException:
+            os.close(fd)
+            tmp_path.unlink(missing_ok=True)
+            raise
+        os.close(fd)
+        os.replace(tmp_path, self.file_path)
@@ -2,21 +2,190 @@
 Flow Manager - Handles workflow between Agent Chat tools and Controller
 """
 
+import itertools
 import json
+import os
+import select
+import socket
+import tempfile
 import threading
 import time
-from datetime import datetime
+import zlib
+from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Dict, List, Any, Optional, Tuple
 
 from ..constants import SHARED_DATA_DIR
 
+# orjson is optional; fall back to the stdlib encoder with identical output options
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Woken whenever a FlowManager in this process delivers to a waiting agent.
+# Module-level because tools create a new FlowManager per call.
+_delivery_condition = threading.Condition()
+_delivery_generation = 0
+
+# Without a doorbell, deliveries made by other processes (e.g. the controller UI)
+# are only seen by re-reading the file
+CROSS_PROCESS_POLL_INTERVAL = 1.0
+
+# With a doorbell the file is re-checked only as a safety net
+DOORBELL_POLL_INTERVAL = 10.0
+
+# Each waiting agent binds a Unix datagram socket here; deliverers send one byte to wake it.
+# Kept in the temp dir because socket paths are length-limited; named per shared data dir.
+_WAKE_DIR = Path(tempfile.gettempdir()) / f"agent_comm_wake_{zlib.crc32(str(SHARED_DATA_DIR).encode()):08x}"
+
+# Reentrant so a mutation can hold it across its read and write; shared by every
+# FlowManager in the process so per-call instances do not race each other
+_file_lock = threading.RLock()
+
+# Queue entries not yet written, per queue file, and files with a flush scheduled
+_queue_buffer: Dict[Path, List[Dict[str, Any]]] = {}
+_queue_flush_scheduled: set = set()
+_queue_buffer_lock = threading.Lock()
+
+# How long a scheduled flush waits so a burst of messages lands in one write
+QUEUE_FLUSH_DELAY = 0.05
+
+# Attempts at swapping a written temp file into place before giving up
+REPLACE_RETRIES = 5
+
+# Per-process sequence for generated IDs; time_ns keeps IDs unique across processes
+_id_counter = itertools.count(1)
+
+
+def _new_id(prefix: str) -> str:
+    return f"{prefix}_{time.time_ns()}_{next(_id_counter)}"
+
+
+def _fsync_dir(dir_path: Path):
+    """Persist renames in ``dir_path``; a no-op where directories cannot be opened (Windows)"""
+    try:
+        fd = os.open(dir_path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _now() -> Tuple[int, str]:
+    """Read the clock once and return it as (epoch nanoseconds, local ISO string)"""
+    ts_ns = time.time_ns()
+    return ts_ns, datetime.fromtimestamp(ts_ns / 1e9).isoformat()
+
+
+# conversation_id -> waiting_ids of the waiting agents file, valid for the stored file key
+_waiter_index: Dict[Path, Tuple[Tuple[int, int, int], Dict[str, List[str]]]] = {}
+
+# Last parsed content per file, keyed by (st_ino, st_mtime_ns, st_size); shared, never
+# mutate. Writes swap in a fresh temp file, so the inode changes even when a same-size
+# rewrite lands within the filesystem's mtime granularity
+_snapshot_cache: Dict[Path, Tuple[Tuple[int, int, int], Dict[str, Any]]] = {}
+
+
+def _loads(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    return json.dumps(obj, indent=2, ensure_ascii=False).encode('utf-8')
+
+
+def _wake_path(waiting_id: str) -> str:
+    return str(_WAKE_DIR / f"{waiting_id}.sock")
+
+
+class _Doorbell:
+    """Cross-process wakeup for one waiting agent.
+
+    Uses a Unix datagram socket where the platform supports it; otherwise
+    ``active`` is False and callers fall back to polling.
+    """
+
+    def __init__(self, waiting_id: str):
+        self._path = _wake_path(waiting_id)
+        self._sock = None
+        if not hasattr(socket, "AF_UNIX"):
+            return
+        try:
+            _WAKE_DIR.mkdir(exist_ok=True)
+            if os.path.exists(self._path):
+                os.unlink(self._path)
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        except OSError:
+            return
+        try:
+            sock.bind(self._path)
+            sock.setblocking(False)
+        except OSError:
+            sock.close()
+            return
+        self._sock = sock
+
+    @property
+    def active(self) -> bool:
+        return self._sock is not None
+
+    def wait(self, timeout: float):
+        """Block until rung or ``timeout`` seconds pass"""
+        readable, _, _ = select.select([self._sock], [], [], timeout)
+        if readable:
+            # Drain so repeated rings do not cause spurious wakeups later
+            try:
+                while self._sock.recv(64):
+                    pass
+            except OSError:
+                pass
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+            try:
+                os.unlink(self._path)
+            except OSError:
+                pass
+
+
+def _ring(waiting_id: str):
+    """Wake the doorbell of ``waiting_id`` if one is listening, in any process"""
+    if not hasattr(socket, "AF_UNIX"):
+        return
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.setblocking(False)
+            sock.sendto(b"1", _wake_path(waiting_id))
+    except OSError:
+        # No listener (waiter in a polling process or already gone)
+        pass
+
+
+def _notify_delivery(waiting_ids: List[str]):
+    global _delivery_generation
+    with _delivery_condition:
+        _delivery_generation += 1
+        _delivery_condition.notify_all()
+    for waiting_id in waiting_ids:
+        _ring(waiting_id)
+
 
 class FlowManager:
     """Manages workflow between Agent Chat 1, Agent Chat 2, and Controller"""
     
     def __init__(self):
-        self._lock = threading.Lock()
+        self._lock = _file_lock
         self.waiting_agents_file = SHARED_DATA_DIR / "waiting_agents.json"
         self.message_queue_file = SHARED_DATA_DIR / "message_queue.json"
         self.conversation_flow_file = SHARED_DATA_DIR / "conversation_flow.json"
@@ -25,30 +194,152 @@ class FlowManager:
     
     def _initialize_files(self):
         """Initialize JSON files if they don't exist"""
-        files_to_init = [
+        try:
+            existing = set(os.listdir(SHARED_DATA_DIR))
+        except FileNotFoundError:
+            existing = set()
+        
+        missing = [
+            (file_path, default_data)
+            for file_path, default_data in self._default_files()
+            if file_path.name not in existing
+        ]
+        if missing:
+            self._write_json_many(missing)
+    
+    def _default_files(self) -> List[Tuple[Path, Dict[str, Any]]]:
+        """Each shared file with its empty content"""
+        return [
             (self.waiting_agents_file, {}),
             (self.message_queue_file, {"pending_messages": []}),
             (self.conversation_flow_file, {"active_conversations": []})
         ]
-        
-        for file_path, default_data in files_to_init:
-            if not file_path.exists():
-                self._write_json(file_path, default_data)
     
-    def _read_json(self, file_path: Path) -> Dict[str, Any]:
-        """Safely read JSON file"""
+    def _read_json(self, file_path: Path, snapshot: bool = False) -> Dict[str, Any]:
+        """Safely read JSON file
+
+        With ``snapshot=True`` the parsed content is reused while the file's
+        mtime and size are unchanged. Snapshots are shared between callers,
+        so they must only be read, never mutated. Snapshot hits do not take
+        the lock, so polling readers never wait behind writers.
+        """
+        if snapshot:
+            key = self._file_key(file_path)
+            if key is None:
+                return {}
+            cached = _snapshot_cache.get(file_path)
+            if cached is not None and cached[0] == key:
+                return cached[1]
+
         with self._lock:
+            if snapshot:
+                # The file may have been rewritten while waiting for the lock
+                key = self._file_key(file_path)
+                if key is None:
+                    return {}
+
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except (FileNotFoundError, json.JSONDecodeError):
+                with open(file_path, 'rb') as f:
+                    data = _loads(f.read())
+            except (FileNotFoundError, ValueError):
                 return {}
+
+            if snapshot:
+                # Stat was taken first, so a concurrent write only makes the key stale
+                _snapshot_cache[file_path] = (key, data)
+            return data
     
-    def _write_json(self, file_path: Path, data: Dict[str, Any]):
-        """Safely write JSON file"""
+    @staticmethod
+    def _file_key(file_path: Path) -> Optional[Tuple[int, int, int]]:
+        """Identify a file version by (st_ino, st_mtime_ns, st_size), or None if missing"""
+        try:
+            st = os.stat(file_path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+    
+    def _write_json(self, file_path: Path, data: Dict[str, Any], publish: bool = False) -> Tuple[int, int, int]:
+        """Safely write JSON file
+
+        The data is written and fsynced to a per-process temp file that then
+        atomically replaces the target, so a crash never leaves a truncated file.
+        With ``publish=True`` the written data also becomes the file's snapshot,
+        so the caller must not mutate it afterwards.
+        """
+        key = self._write_json_many([(file_path, data)])[0]
+        if publish:
+            _snapshot_cache[file_path] = (key, data)
+        return key
+    
+    def _write_json_many(self, items: List[Tuple[Path, Dict[str, Any]]]) -> List[Tuple[int, int, int]]:
+        """Write several JSON files as one batch
+
+        All temp files are written before any is swapped in, and the
+        directory entries are synced once at the end. Returns the
+        (st_ino, st_mtime_ns, st_size) key of each written file.
+        """
+        payloads = [(file_path, _dumps(data)) for file_path, data in items]
         with self._lock:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
+            tmp_paths = []
+            keys = []
+            for file_path, payload in payloads:
+                _snapshot_cache.pop(file_path, None)
+                tmp_path = file_path.with_name(f"{file_path.name}.{os.getpid()}.tmp")
+                with open(tmp_path, 'wb') as f:
+                    f.write(payload)
+                    f.flush()
+                    os.fsync(f.fileno())
+                    # os.replace keeps the inode, so this is the target's key once swapped in
+                    st = os.fstat(f.fileno())
+                tmp_paths.append(tmp_path)
+                keys.append((st.st_ino, st.st_mtime_ns, st.st_size))
+            
+            for (file_path, _), tmp_path in zip(payloads, tmp_paths):
+                self._replace(tmp_path, file_path)
+            _fsync_dir(payloads[0][0].parent)
+        return keys
+    
+    @staticmethod
+    def _replace(tmp_path: Path, file_path: Path):
+        for attempt in range(REPLACE_RETRIES):
+            try:
+                os.replace(tmp_path, file_path)
+                return
+            except PermissionError:
+                # Windows refuses to replace a file another process has open for reading
+                if attempt == REPLACE_RETRIES - 1:
+                    raise
+                time.sleep(0.01)
+    
+    def _read_waiting_for_update(self) -> Tuple[Dict[str, Any], Optional[Tuple[int, int, int]]]:
+        """Read waiting agents for modification, with the file key they correspond to.
+
+        The key is None if another process rewrote the file during the read.
+        Must be called with the lock held.
+        """
+        key = self._file_key(self.waiting_agents_file)
+        waiting_data = self._read_json(self.waiting_agents_file)
+        if self._file_key(self.waiting_agents_file) != key:
+            key = None
+        return waiting_data, key
+    
+    def _cached_waiter_index(self, key: Optional[Tuple[int, int, int]]) -> Optional[Dict[str, List[str]]]:
+        cached = _waiter_index.get(self.waiting_agents_file)
+        if key is not None and cached is not None and cached[0] == key:
+            return cached[1]
+        return None
+    
+    def _waiters_by_conversation(self, waiting_data: Dict[str, Any],
+                                 key: Optional[Tuple[int, int, int]]) -> Dict[str, List[str]]:
+        """Map conversation_id to waiting_ids, reusing the index while the file is unchanged"""
+        index = self._cached_waiter_index(key)
+        if index is None:
+            index = {}
+            for waiting_id, agent_data in waiting_data.items():
+                index.setdefault(agent_data.get("conversation_id"), []).append(waiting_id)
+            if key is not None:
+                _waiter_index[self.waiting_agents_file] = (key, index)
+        return index
     
     def register_waiting_agent(
         self,
@@ -60,48 +351,55 @@ class FlowManager:
         skip_queue: bool = False,
     ) -> str:
         """Register an agent as waiting and associate with a conversation"""
-        waiting_data = self._read_json(self.waiting_agents_file)
+        ts_ns, now_iso = _now()
+        with self._lock:
+            waiting_data, waiting_key = self._read_waiting_for_update()
 
-        if participants is None:
-            participants = [agent_id]
-
-        if conversation_id is None:
-            conversation_id = f"conv_{int(time.time())}"
-
-        # Update conversation tracking
-        conv_data = self._read_json(self.conversation_flow_file)
-        conv_list = conv_data.get("active_conversations", [])
-        existing = next((c for c in conv_list if c.get("conversation_id") == conversation_id), None)
-        if existing:
-            existing_participants = set(existing.get("participants", []))
-            existing_participants.update(participants)
-            existing["participants"] = list(existing_participants)
-            existing["last_update"] = datetime.now().isoformat()
-        else:
-            conv_list.append(
-                {
-                    "conversation_id": conversation_id,
-                    "participants": list(participants),
-                    "created_at": datetime.now().isoformat(),
-                    "last_update": datetime.now().isoformat(),
-                }
-            )
-        conv_data["active_conversations"] = conv_list
-        self._write_json(self.conversation_flow_file, conv_data)
-
-        waiting_id = f"{agent_tool}_{int(time.time())}"
-
-        waiting_data[waiting_id] = {
-            "agent_tool": agent_tool,
-            "agent_id": agent_id,
-            "conversation_id": conversation_id,
-            "participants": list(participants),
-            "message": message,
-            "timestamp": datetime.now().isoformat(),
-            "status": "waiting",
-        }
+            if participants is None:
+                participants = [agent_id]
 
-        self._write_json(self.waiting_agents_file, waiting_data)
+            if conversation_id is None:
+                conversation_id = _new_id("conv")
+
+            # Update conversation tracking
+            conv_data = self._read_json(self.conversation_flow_file)
+            conv_list = conv_data.get("active_conversations", [])
+            existing = next((c for c in conv_list if c.get("conversation_id") == conversation_id), None)
+            if existing:
+                existing_participants = set(existing.get("participants", []))
+                existing_participants.update(participants)
+                existing["participants"] = list(existing_participants)
+                existing["last_update"] = now_iso
+            else:
+                conv_list.append(
+                    {
+                        "conversation_id": conversation_id,
+                        "participants": list(participants),
+                        "created_at": now_iso,
+                        "last_update": now_iso,
+                    }
+                )
+            conv_data["active_conversations"] = conv_list
+            self._write_json(self.conversation_flow_file, conv_data)
+
+            waiting_id = _new_id(agent_tool)
+
+            waiting_data[waiting_id] = {
+                "agent_tool": agent_tool,
+                "agent_id": agent_id,
+                "conversation_id": conversation_id,
+                "participants": list(participants),
+                "message": message,
+                "timestamp": now_iso,
+                "ts_ns": ts_ns,
+                "status": "waiting",
+            }
+
+            new_key = self._write_json(self.waiting_agents_file, waiting_data)
+            index = self._cached_waiter_index(waiting_key)
+            if index is not None:
+                index.setdefault(conversation_id, []).append(waiting_id)
+                _waiter_index[self.waiting_agents_file] = (new_key, index)
 
         if message and not skip_queue:
             self.add_message_to_queue(conversation_id, agent_id, message, participants, waiting_id)
@@ -117,36 +415,64 @@ class FlowManager:
         waiting_id: Optional[str] = None,
     ):
         """Add message to queue for delivery within a conversation"""
-        queue_data = self._read_json(self.message_queue_file)
-
-        if "pending_messages" not in queue_data or not isinstance(
-            queue_data.get("pending_messages"), list
-        ):
-            queue_data["pending_messages"] = []
-
         targets = [p for p in participants if p != from_agent]
+        ts_ns, now_iso = _now()
         message_entry = {
-            "id": f"msg_{int(time.time())}",
+            "id": _new_id("msg"),
             "conversation_id": conversation_id,
             "from_agent": from_agent,
             "message": message,
             "targets": targets,
-            "timestamp": datetime.now().isoformat(),
-            "delivered": {t: False for t in targets},
+            "timestamp": now_iso,
+            "ts_ns": ts_ns,
+            # Bit i is set once targets[i] has received the message
+            "delivered_mask": 0,
         }
         if waiting_id:
             message_entry["waiting_id"] = waiting_id
 
-        queue_data["pending_messages"].append(message_entry)
-        self._write_json(self.message_queue_file, queue_data)
+        # Buffer the entry; a short-lived thread writes the whole burst at once
+        queue_file = self.message_queue_file
+        with _queue_buffer_lock:
+            _queue_buffer.setdefault(queue_file, []).append(message_entry)
+            if queue_file in _queue_flush_scheduled:
+                return
+            _queue_flush_scheduled.add(queue_file)
+        # Not a daemon, so buffered messages are still written if the process exits
+        threading.Thread(target=self._flush_after_delay, name="flow-queue-flush").start()
+
+    def _flush_after_delay(self):
+        time.sleep(QUEUE_FLUSH_DELAY)
+        with _queue_buffer_lock:
+            _queue_flush_scheduled.discard(self.message_queue_file)
+        self.flush()
+
+    def flush(self):
+        """Write buffered queue entries to the message queue file"""
+        with self._lock:
+            # Taken under the file lock so concurrent flushes keep message order
+            with _queue_buffer_lock:
+                batch = _queue_buffer.pop(self.message_queue_file, None)
+            if not batch:
+                return
+
+            queue_data = self._read_json(self.message_queue_file)
+            if "pending_messages" not in queue_data or not isinstance(
+                queue_data.get("pending_messages"), list
+            ):
+                queue_data["pending_messages"] = []
+
+            queue_data["pending_messages"].extend(batch)
+            self._write_json(self.message_queue_file, queue_data)
 
     def get_waiting_agents(self) -> Dict[str, Any]:
         """Get all agents currently waiting"""
-        return self._read_json(self.waiting_agents_file)
+        return self._read_json(self.waiting_agents_file, snapshot=True)
     
     def get_message_queue(self) -> List[Dict[str, Any]]:
         """Get pending messages queue"""
-        queue_data = self._read_json(self.message_queue_file)
+        self.flush()
+        queue_data = self._read_json(self.message_queue_file, snapshot=True)
         return queue_data.get("pending_messages", [])
     
     def deliver_message_to_agent(self, waiting_id: str, message_content: str) -> bool:
@@ -160,45 +486,78 @@ class FlowManager:
         Returns:
             True if successful
         """
-        waiting_data = self._read_json(self.waiting_agents_file)
-        
-        if waiting_id in waiting_data:
-            # Update status to delivered
-            waiting_data[waiting_id]["status"] = "delivered"
-            waiting_data[waiting_id]["delivered_message"] = message_content
-            waiting_data[waiting_id]["delivered_at"] = datetime.now().isoformat()
+        with self._lock:
+            waiting_data, waiting_key = self._read_waiting_for_update()
             
-            self._write_json(self.waiting_agents_file, waiting_data)
-            return True
+            if waiting_id in waiting_data:
+                # Update status to delivered
+                waiting_data[waiting_id]["status"] = "delivered"
+                waiting_data[waiting_id]["delivered_message"] = message_content
+                waiting_data[waiting_id]["delivered_at"] = datetime.now().isoformat()
+                
+                # Published so the woken waiter reads its status without re-parsing
+                new_key = self._write_json(self.waiting_agents_file, waiting_data, publish=True)
+                # Status changes leave the conversation index as it was
+                index = self._cached_waiter_index(waiting_key)
+                if index is not None:
+                    _waiter_index[self.waiting_agents_file] = (new_key, index)
+                _notify_delivery([waiting_id])
+                return True
         
         return False
     
     def remove_waiting_agent(self, waiting_id: str):
         """Remove agent from waiting state"""
-        waiting_data = self._read_json(self.waiting_agents_file)
-        
-        if waiting_id in waiting_data:
-            del waiting_data[waiting_id]
-            self._write_json(self.waiting_agents_file, waiting_data)
+        with self._lock:
+            waiting_data, waiting_key = self._read_waiting_for_update()
+            
+            if waiting_id in waiting_data:
+                conversation_id = waiting_data.pop(waiting_id).get("conversation_id")
+                new_key = self._write_json(self.waiting_agents_file, waiting_data)
+                index = self._cached_waiter_index(waiting_key)
+                if index is not None:
+                    waiting_ids = index.get(conversation_id, [])
+                    if waiting_id in waiting_ids:
+                        waiting_ids.remove(waiting_id)
+                    if not waiting_ids:
+                        index.pop(conversation_id, None)
+                    _waiter_index[self.waiting_agents_file] = (new_key, index)
     
     def mark_message_delivered(self, message_id: str, agent_ids: Optional[List[str]] = None):
         """Mark message as delivered for specified agents"""
-        queue_data = self._read_json(self.message_queue_file)
-
-        for msg in queue_data.get("pending_messages", []):
-            if msg.get("id") == message_id:
-                delivered = msg.setdefault("delivered", {})
-                if agent_ids is None:
-                    agent_ids = list(delivered.keys())
-                for agent in agent_ids:
-                    if agent in delivered:
-                        delivered[agent] = True
-                msg["delivered_all"] = all(delivered.values()) if delivered else True
-                if msg["delivered_all"]:
-                    msg["delivered_at"] = datetime.now().isoformat()
-                break
-
-        self._write_json(self.message_queue_file, queue_data)
+        with self._lock:
+            self.flush()
+            queue_data = self._read_json(self.message_queue_file)
+
+            # Acks almost always target recently queued messages, so search from the end
+            for msg in reversed(queue_data.get("pending_messages", [])):
+                if msg.get("id") == message_id:
+                    if "delivered_mask" in msg:
+                        targets = msg.get("targets", [])
+                        full_mask = (1 << len(targets)) - 1
+                        if agent_ids is None:
+                            mask = full_mask
+                        else:
+                            mask = msg["delivered_mask"]
+                            for index, target in enumerate(targets):
+                                if target in agent_ids:
+                                    mask |= 1 << index
+                        msg["delivered_mask"] = mask
+                        msg["delivered_all"] = mask == full_mask
+                    else:
+                        # Entries queued before the bitmask stored a per-target dict
+                        delivered = msg.setdefault("delivered", {})
+                        if agent_ids is None:
+                            agent_ids = list(delivered.keys())
+                        for agent in agent_ids:
+                            if agent in delivered:
+                                delivered[agent] = True
+                        msg["delivered_all"] = all(delivered.values()) if delivered else True
+                    if msg["delivered_all"]:
+                        msg["delivered_at"] = datetime.now().isoformat()
+                    # Only rewrite the queue when the message was found
+                    self._write_json(self.message_queue_file, queue_data)
+                    break
 
     def deliver_message_to_participants(
         self,
@@ -208,29 +567,38 @@ class FlowManager:
         message_id: str,
     ) -> bool:
         """Deliver message content to specified participants"""
-        waiting_data = self._read_json(self.waiting_agents_file)
-        delivered_any = False
+        with self._lock:
+            waiting_data, waiting_key = self._read_waiting_for_update()
+            index = self._waiters_by_conversation(waiting_data, waiting_key)
+            delivered_ids = []
+            now_iso = datetime.now().isoformat()
 
-        for waiting_id, agent_data in waiting_data.items():
-            if (
-                agent_data.get("conversation_id") == conversation_id
-                and agent_data.get("agent_id") in agent_ids
-                and agent_data.get("status") == "waiting"
-            ):
-                agent_data["status"] = "delivered"
-                agent_data["delivered_message"] = message_content
-                agent_data["delivered_at"] = datetime.now().isoformat()
-                delivered_any = True
+            # Only visit this conversation's waiters instead of every waiting agent
+            for waiting_id in index.get(conversation_id, ()):
+                agent_data = waiting_data.get(waiting_id)
+                if (
+                    agent_data is not None
+                    and agent_data.get("agent_id") in agent_ids
+                    and agent_data.get("status") == "waiting"
+                ):
+                    agent_data["status"] = "delivered"
+                    agent_data["delivered_message"] = message_content
+                    agent_data["delivered_at"] = now_iso
+                    delivered_ids.append(waiting_id)
 
-        if delivered_any:
-            self._write_json(self.waiting_agents_file, waiting_data)
-            self.mark_message_delivered(message_id, agent_ids)
+            if delivered_ids:
+                new_key = self._write_json(self.waiting_agents_file, waiting_data, publish=True)
+                if waiting_key is not None:
+                    _waiter_index[self.waiting_agents_file] = (new_key, index)
+                self.mark_message_delivered(message_id, agent_ids)
 
-        return delivered_any
+        if delivered_ids:
+            _notify_delivery(delivered_ids)
+        return bool(delivered_ids)
     
     def get_agent_status(self, waiting_id: str) -> Optional[Dict[str, Any]]:
         """Get status of specific waiting agent"""
-        waiting_data = self._read_json(self.waiting_agents_file)
+        waiting_data = self._read_json(self.waiting_agents_file, snapshot=True)
         return waiting_data.get(waiting_id)
     
     def wait_for_delivery(self, waiting_id: str, timeout: int = None) -> Optional[str]:
@@ -244,23 +612,45 @@ class FlowManager:
         Returns:
             Delivered message content or None if timeout (never with infinite wait)
         """
-        start_time = time.time()
+        start_time = time.monotonic()
+        # Bound before the first check so a ring arriving in between stays queued
+        doorbell = _Doorbell(waiting_id)
+        poll_interval = DOORBELL_POLL_INTERVAL if doorbell.active else CROSS_PROCESS_POLL_INTERVAL
+        read_json = self._read_json
+        waiting_file = self.waiting_agents_file
+        monotonic = time.monotonic
         
-        while True:
-            status = self.get_agent_status(waiting_id)
-            
-            if status and status.get("status") == "delivered":
-                return status.get("delivered_message")
-            
-            # Check timeout only if specified
-            if timeout is not None and time.time() - start_time >= timeout:
-                return None  # Timeout
-            
-            time.sleep(1)  # Check every second
+        try:
+            while True:
+                # Snapshot before reading so a delivery landing mid-check is not missed
+                generation = _delivery_generation
+                # One stat while unchanged; deliveries from this process publish their snapshot
+                status = read_json(waiting_file, snapshot=True).get(waiting_id)
+                
+                if status and status.get("status") == "delivered":
+                    return status.get("delivered_message")
+                
+                # Check timeout only if specified
+                wait_time = poll_interval
+                if timeout is not None:
+                    remaining = timeout - (monotonic() - start_time)
+                    if remaining <= 0:
+                        return None  # Timeout
+                    wait_time = min(wait_time, remaining)
+                
+                if doorbell.active:
+                    # Rung by deliveries from this or any other process
+                    doorbell.wait(wait_time)
+                else:
+                    # Wake immediately on in-process deliveries, otherwise re-check the file periodically
+                    with _delivery_condition:
+                        _delivery_condition.wait_for(lambda: _delivery_generation != generation, wait_time)
+        finally:
+            doorbell.close()
     
     def get_conversations(self) -> Dict[str, Any]:
         """Return active conversations with participant lists"""
-        conv_data = self._read_json(self.conversation_flow_file)
+        conv_data = self._read_json(self.conversation_flow_file, snapshot=True)
         conversations = {}
         for conv in conv_data.get("active_conversations", []):
             conv_id = conv.get("conversation_id")
@@ -278,41 +668,40 @@ class FlowManager:
     
     def cleanup_old_data(self, hours: int = 24):
         """Clean up old waiting agents and messages"""
-        from datetime import datetime, timedelta
-        
+        cutoff_ns = time.time_ns() - hours * 3_600_000_000_000
         cutoff_time = datetime.now() - timedelta(hours=hours)
         
-        # Clean waiting agents
-        waiting_data = self._read_json(self.waiting_agents_file)
-        cleaned_waiting = {}
-        
-        for waiting_id, data in waiting_data.items():
-            timestamp_str = data.get("timestamp", "")
+        def is_recent(record: Dict[str, Any]) -> bool:
+            ts_ns = record.get("ts_ns")
+            if ts_ns is not None:
+                return ts_ns > cutoff_ns
+            # Records written before ts_ns existed only carry the ISO timestamp
             try:
-                timestamp = datetime.fromisoformat(timestamp_str)
-                if timestamp > cutoff_time:
-                    cleaned_waiting[waiting_id] = data
-            except ValueError:
+                return datetime.fromisoformat(record.get("timestamp", "")) > cutoff_time
+            except (TypeError, ValueError):
                 # Keep if can't parse timestamp
-                cleaned_waiting[waiting_id] = data
-        
-        self._write_json(self.waiting_agents_file, cleaned_waiting)
-        
-        # Clean message queue
-        queue_data = self._read_json(self.message_queue_file)
-        cleaned_messages = []
+                return True
         
-        for msg in queue_data.get("pending_messages", []):
-            timestamp_str = msg.get("timestamp", "")
-            try:
-                timestamp = datetime.fromisoformat(timestamp_str)
-                if timestamp > cutoff_time or not msg.get("delivered", False):
-                    cleaned_messages.append(msg)
-            except ValueError:
-                cleaned_messages.append(msg)
+        with self._lock:
+            self.flush()
+
+            # Clean waiting agents
+            waiting_data = self._read_json(self.waiting_agents_file)
+            cleaned_waiting = {
+                waiting_id: data for waiting_id, data in waiting_data.items() if is_recent(data)
+            }
+            if len(cleaned_waiting) != len(waiting_data):
+                self._write_json(self.waiting_agents_file, cleaned_waiting)
         
-        queue_data["pending_messages"] = cleaned_messages
-        self._write_json(self.message_queue_file, queue_data)
+            # Clean message queue, keeping undelivered messages regardless of age
+            queue_data = self._read_json(self.message_queue_file)
+            messages = queue_data.get("pending_messages", [])
+            cleaned_messages = [
+                msg for msg in messages if not msg.get("delivered_all", False) or is_recent(msg)
+            ]
+            if len(cleaned_messages) != len(messages):
+                queue_data["pending_messages"] = cleaned_messages
+                self._write_json(self.message_queue_file, queue_data)
     
     def delete_messages(self, message_ids: List[str]) -> int:
         """
@@ -327,26 +716,31 @@ class FlowManager:
         if not message_ids:
             return 0
         
-        queue_data = self._read_json(self.message_queue_file)
+        with self._lock:
+            self.flush()
+            queue_data = self._read_json(self.message_queue_file)
         
-        # Filter out messages with matching IDs
-        original_count = len(queue_data.get("pending_messages", []))
-        queue_data["pending_messages"] = [
-            msg for msg in queue_data.get("pending_messages", [])
-            if msg.get("id") not in message_ids
-        ]
+            # Filter out messages with matching IDs
+            message_ids = set(message_ids)
+            original_count = len(queue_data.get("pending_messages", []))
+            queue_data["pending_messages"] = [
+                msg for msg in queue_data.get("pending_messages", [])
+                if msg.get("id") not in message_ids
+            ]
         
-        new_count = len(queue_data["pending_messages"])
-        deleted_count = original_count - new_count
+            new_count = len(queue_data["pending_messages"])
+            deleted_count = original_count - new_count
         
-        # Write back the updated queue
-        self._write_json(self.message_queue_file, queue_data)
+            # Write back the updated queue
+            if deleted_count:
+                self._write_json(self.message_queue_file, queue_data)
         
         return deleted_count
     
     def clear_all_data(self):
         """Clear ALL data - for complete reset"""
         # Reset all files to empty state
-        self._write_json(self.waiting_agents_file, {})
-        self._write_json(self.message_queue_file, {"pending_messages": []})
-        self._write_json(self.conversation_flow_file, {"active_conversations": []}) 
\ No newline at end of file
+        with self._lock:
+            with _queue_buffer_lock:
+                _queue_buffer.pop(self.message_queue_file, None)
+            self._write_json_many(self._default_files()) 
\ No newline at end of file
@@ -2,9 +2,55 @@
 Message Handler - Handles message routing and processing logic
 """
 
+from collections import OrderedDict
+from functools import lru_cache
 from typing import Dict, List, Any, Optional, Tuple
 from .state_manager import StateManager
 
+# Substrings checked in order against the lowercased agent ID; the first hit
+# wins ("chatgpt" is covered by "gpt")
+_AGENT_TYPE_NEEDLES = (
+    ("claude", "claude"),
+    ("gpt", "chatgpt"),
+    ("gemini", "gemini"),
+    ("copilot", "copilot"),
+)
+
+
+# Formatted history text per (conv_id, limit, last_update, message_count, status_version)
+HISTORY_CACHE_SIZE = 256
+_history_cache: "OrderedDict[tuple, str]" = OrderedDict()
+
+
+@lru_cache(maxsize=1024)
+def _infer_type(agent_id: str) -> str:
+    agent_id_lower = agent_id.lower()
+    for needle, agent_type in _AGENT_TYPE_NEEDLES:
+        if needle in agent_id_lower:
+            return agent_type
+    return "custom"
+
+
+@lru_cache(maxsize=2048)
+def _parse_agent_id(agent_input: str) -> Tuple[str, str, str]:
+    agent_id, sep, rest = agent_input.partition(":")
+    if not sep:
+        # Just ID
+        agent_id = agent_id.strip()
+        return agent_id, agent_id, "custom"
+
+    agent_id = agent_id.strip()
+    agent_name, sep, agent_type = rest.partition(":")
+    if not sep:
+        # ID:Name, type inferred from ID
+        return agent_id, agent_name.strip(), _infer_type(agent_id)
+    if ":" not in agent_type:
+        # ID:Name:Type
+        return agent_id, agent_name.strip(), agent_type.strip()
+
+    # Fallback
+    return agent_input, agent_input, "custom"
+
 
 class MessageHandler:
     """Handles message processing and routing between agents"""
@@ -13,28 +59,30 @@ class MessageHandler:
         self.state_manager = StateManager()
     
     def send_message(self, from_agent: str, to_agent: str, message: str,
-                    agent_name: str = None, agent_type: str = "custom") -> Tuple[bool, str]:
+                    agent_name: str = None, agent_type: str = "custom",
+                    priority: int = 0) -> Tuple[bool, str]:
         """
         Send a message from one agent to another
+
+        A higher ``priority`` is delivered ahead of waiting lower-priority messages.
         
         Returns:
             Tuple of (success: bool, result_message: str)
         """
         try:
             # Register agents if not exists
-            self._ensure_agent_registered(from_agent, agent_name or from_agent, agent_type)
-            self._ensure_agent_registered(to_agent, to_agent, "custom")
+            self.state_manager.ensure_agents_registered([
+                (from_agent, agent_name or from_agent, agent_type),
+                (to_agent, to_agent, "custom"),
+            ])
             
             # Update sender activity
             self.state_manager.update_agent_activity(from_agent)
             
-            # Find or create conversation
-            conv_id = self.state_manager.find_conversation([from_agent, to_agent])
-            if not conv_id:
-                conv_id = self.state_manager.create_conversation([from_agent, to_agent])
-
-            # Add message to conversation
-            msg_id = self.state_manager.add_message(conv_id, from_agent, message)
+            # Find or create conversation and add the message in one write
+            conv_id, msg_id = self.state_manager.post_message(
+                [from_agent, to_agent], from_agent, message, priority
+            )
             
             return True, f"Message sent successfully to {to_agent}. Conversation: {conv_id}, Message: {msg_id}"
             
@@ -62,9 +110,9 @@ class MessageHandler:
 
         try:
             # Ensure all agents are registered
-            self._ensure_agent_registered(from_agent, from_agent, "custom")
-            for participant in participants:
-                self._ensure_agent_registered(participant, participant, "custom")
+            self.state_manager.ensure_agents_registered(
+                [(agent, agent, "custom") for agent in [from_agent, *participants]]
+            )
 
             # Update sender activity
             self.state_manager.update_agent_activity(from_agent)
@@ -72,13 +120,8 @@ class MessageHandler:
             # Build participant list including sender and remove duplicates
             conv_participants = list(set(participants + [from_agent]))
 
-            # Find or create conversation with all participants
-            conv_id = self.state_manager.find_conversation(conv_participants)
-            if not conv_id:
-                conv_id = self.state_manager.create_conversation(conv_participants)
-
-            # Add message to conversation
-            msg_id = self.state_manager.add_message(conv_id, from_agent, message)
+            # Find or create conversation with all participants and add the message
+            conv_id, msg_id = self.state_manager.post_message(conv_participants, from_agent, message)
 
             return True, (
                 f"Message sent successfully to group. Conversation: {conv_id}, "
@@ -89,9 +132,12 @@ class MessageHandler:
             return False, f"Error sending group message: {str(e)}"
     
     def check_messages(self, agent_id: str, agent_name: str = None, 
-                      agent_type: str = "custom") -> Tuple[bool, str]:
+                      agent_type: str = "custom", wait: float = 0) -> Tuple[bool, str]:
         """
         Check for pending messages for an agent
+
+        With ``wait`` > 0, blocks up to that many seconds for a message to
+        arrive instead of returning straight away when there is none.
         
         Returns:
             Tuple of (success: bool, result_message: str)
@@ -104,41 +150,38 @@ class MessageHandler:
             self.state_manager.update_agent_activity(agent_id)
             
             # Aggregate pending messages across all conversations where agent participates
-            pending_messages = self.state_manager.get_pending_messages_for_agent(agent_id)
+            if wait > 0:
+                pending_messages = self.state_manager.wait_for_pending_messages(agent_id, wait)
+            else:
+                pending_messages = self.state_manager.get_pending_messages_for_agent(agent_id)
             
             if not pending_messages:
                 return True, f"No new messages for {agent_id}."
             
-            # Process messages
-            result_messages = []
+            # Mark everything delivered for this agent in one write
+            delivered: Dict[str, List[str]] = {}
             for msg_data in pending_messages:
-                conv_id = msg_data["conversation_id"]
-                message = msg_data["message"]
+                delivered.setdefault(msg_data["conversation_id"], []).append(msg_data["message"]["id"])
+            self.state_manager.mark_messages_delivered(delivered, agent_id)
 
-                # Mark as delivered for this agent
-                self.state_manager.mark_message_delivered(conv_id, message["id"], agent_id)
-
-                # Format message for display with conversation context
-                from_agent = message["from"]
-                content = message["content"]
-                timestamp = message["timestamp"]
-
-                result_messages.append(
-                    f"[{conv_id}] From {from_agent} ({timestamp}): {content}"
-                )
-
-            # Combine all messages
-            if len(result_messages) == 1:
+            # Format messages for display with conversation context
+            if len(pending_messages) == 1:
+                msg_data = pending_messages[0]
+                message = msg_data["message"]
                 return True, (
                     "You have a new message:\n\n"
-                    f"{result_messages[0]}\n\nPlease respond to this message."
+                    f"[{msg_data['conversation_id']}] From {message['from']} "
+                    f"({message['timestamp']}): {message['content']}"
+                    "\n\nPlease respond to this message."
                 )
             else:
                 messages_text = "\n\n".join(
-                    [f"{i + 1}. {msg}" for i, msg in enumerate(result_messages)]
+                    f"{i}. [{msg_data['conversation_id']}] From {msg_data['message']['from']} "
+                    f"({msg_data['message']['timestamp']}): {msg_data['message']['content']}"
+                    for i, msg_data in enumerate(pending_messages, 1)
                 )
                 return True, (
-                    f"You have {len(result_messages)} new messages:\n\n"
+                    f"You have {len(pending_messages)} new messages:\n\n"
                     f"{messages_text}\n\nPlease respond to these messages."
                 )
                 
@@ -162,25 +205,36 @@ class MessageHandler:
                 return True, f"Conversation {conv_id} not found."
             
             messages = conversation.get("messages", [])
-            
-            # Get recent messages (limit)
-            recent_messages = messages[-limit:] if len(messages) > limit else messages
-            
-            if not recent_messages:
+            if not messages:
+                return True, f"No messages in conversation between {agent1} and {agent2}."
+
+            # Any new message or status change moves one of these, so the text can be reused
+            key = (
+                conv_id,
+                limit,
+                conversation.get("last_update"),
+                conversation.get("message_count", 0),
+                conversation.get("status_version", 0),
+            )
+            conversation_text = _history_cache.get(key)
+            if conversation_text is None:
+                # Get recent messages (limit)
+                recent_messages = messages[-limit:] if len(messages) > limit else messages
+
+                # Format conversation
+                conversation_text = "\n".join(
+                    f"[{msg['timestamp']}] {msg['from']}: {msg['content']} "
+                    f"[{', '.join(f'{k}:{v}' for k, v in msg.get('status', {}).items())}]"
+                    for msg in recent_messages
+                )
+                _history_cache[key] = conversation_text
+                if len(_history_cache) > HISTORY_CACHE_SIZE:
+                    _history_cache.popitem(last=False)
+            else:
+                _history_cache.move_to_end(key)
+
+            if not conversation_text:
                 return True, f"No messages in conversation between {agent1} and {agent2}."
-            
-            # Format conversation
-            formatted_messages = []
-            for msg in recent_messages:
-                from_agent = msg["from"]
-                content = msg["content"]
-                timestamp = msg["timestamp"]
-                status_dict = msg.get("status", {})
-                status = ", ".join(f"{k}:{v}" for k, v in status_dict.items())
-
-                formatted_messages.append(f"[{timestamp}] {from_agent}: {content} [{status}]")
-            
-            conversation_text = "\n".join(formatted_messages)
             
             return True, f"Conversation between {agent1} and {agent2}:\n\n{conversation_text}"
             
@@ -250,8 +304,7 @@ class MessageHandler:
     
     def _ensure_agent_registered(self, agent_id: str, agent_name: str, agent_type: str):
         """Ensure agent is registered in the system"""
-        agent_info = self.state_manager.get_agent_info(agent_id)
-        if not agent_info:
+        if not self.state_manager.is_agent_registered(agent_id):
             self.state_manager.register_agent(agent_id, agent_name, agent_type)
     
     def parse_agent_id(self, agent_input: str) -> Tuple[str, str, str]:
@@ -263,40 +316,8 @@ class MessageHandler:
             "claude:Claude Sonnet" -> ("claude", "Claude Sonnet", "claude")
             "chatgpt:ChatGPT-4:openai" -> ("chatgpt", "ChatGPT-4", "openai")
         """
-        parts = agent_input.split(":")
-        
-        if len(parts) == 1:
-            # Just ID
-            agent_id = parts[0].strip()
-            return agent_id, agent_id, "custom"
-        elif len(parts) == 2:
-            # ID:Name
-            agent_id = parts[0].strip()
-            agent_name = parts[1].strip()
-            # Infer type from ID
-            agent_type = self._infer_agent_type(agent_id)
-            return agent_id, agent_name, agent_type
-        elif len(parts) == 3:
-            # ID:Name:Type
-            agent_id = parts[0].strip()
-            agent_name = parts[1].strip()
-            agent_type = parts[2].strip()
-            return agent_id, agent_name, agent_type
-        else:
-            # Fallback
-            return agent_input, agent_input, "custom"
+        return _parse_agent_id(agent_input)
     
     def _infer_agent_type(self, agent_id: str) -> str:
         """Infer agent type from agent ID"""
-        agent_id_lower = agent_id.lower()
-        
-        if "claude" in agent_id_lower:
-            return "claude"
-        elif "chatgpt" in agent_id_lower or "gpt" in agent_id_lower:
-            return "chatgpt"
-        elif "gemini" in agent_id_lower:
-            return "gemini"
-        elif "copilot" in agent_id_lower:
-            return "copilot"
-        else:
-            return "custom"
+        return _infer_type(agent_id)
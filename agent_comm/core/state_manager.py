@@ -3,11 +3,16 @@ State Manager - Handles JSON file operations for shared state
 """
 
 import json
+import logging
+import mmap
+import os
 import threading
 import time
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Any, Optional, Iterable
+from typing import Dict, List, Any, Optional, Iterable, Iterator, Set, Tuple
 
 from .file_scoped_editor import FileScopedEditor
 
@@ -15,15 +20,118 @@ from ..constants import (
     CONVERSATIONS_FILE,
     PENDING_CALLS_FILE, 
     AGENT_REGISTRY_FILE,
-    MESSAGE_STATUS
+    ARCHIVE_DIR,
+    MESSAGE_STATUS,
+    MAX_MESSAGES_PER_CONVERSATION,
+    MAX_PENDING_PER_AGENT
 )
 
+# orjson is optional; fall back to the stdlib encoder with identical output options
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Status values resolved once instead of per message
+_PENDING = MESSAGE_STATUS["PENDING"]
+_DELIVERED = MESSAGE_STATUS["DELIVERED"]
+_DROPPED = MESSAGE_STATUS["DROPPED"]
+
+logger = logging.getLogger(__name__)
+
+# Counters computed for conversations stored without a "stats" block
+LEGACY_STATS_CACHE_SIZE = 1024
+
+# Tools create a StateManager per call, so the locks guarding read-modify-write
+# cycles are shared by every instance in the process. There is one per file, so
+# activity updates, pending calls and messages never wait on each other
+_file_locks: Dict[Path, threading.RLock] = {}
+
+# Parsed file contents keyed by path, valid while (st_ino, st_mtime_ns, st_size)
+# matches. Every write swaps in a fresh temp file, so the inode changes even when a
+# same-size rewrite lands within the filesystem's mtime granularity
+_snapshot_cache: Dict[Path, Tuple[Tuple[int, int, int], Dict[str, Any]]] = {}
+
+# Per conversations file: (file key, agent_id -> {conv_id: None} ordered set,
+# participant set -> first conv_id with exactly those participants)
+_participant_indexes: Dict[
+    Path, Tuple[Optional[Tuple[int, int, int]], Dict[str, Dict[str, None]], Dict[frozenset, str]]
+] = {}
+
+# Agent IDs seen in the registry; entries are never removed from it, so
+# membership stays true until the registry file itself is recreated
+_known_agents: Set[str] = set()
+
+# Activity timestamps not yet written to the registry, and whether a flush is scheduled
+_activity_buffer: Dict[str, str] = {}
+_activity_flush_scheduled = False
+_activity_buffer_lock = threading.Lock()
+
+# How long a scheduled flush waits so a burst of activity updates lands in one write
+ACTIVITY_FLUSH_DELAY = 0.025
+
+# Activity updates for the same agent closer together than this are dropped;
+# last_active is only shown with second-level meaning
+ACTIVITY_DEBOUNCE_INTERVAL = 1.0
+_last_activity: Dict[str, float] = {}
+
+# Attempts at swapping a written temp file into place before giving up
+REPLACE_RETRIES = 5
+
+# Woken whenever a StateManager in this process adds a message
+_message_condition = threading.Condition()
+_message_generation = 0
+
+# Messages added by other processes are only seen by re-checking the file
+MESSAGE_POLL_INTERVAL = 1.0
+
+
+def _load_file(file_path: Path) -> Any:
+    """Parse a JSON file; with orjson it parses straight from a read-only mapping"""
+    with open(file_path, 'rb') as f:
+        if orjson is None:
+            return json.loads(f.read())
+        # An empty file cannot be mapped; report it like any other invalid JSON
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            with memoryview(mm) as view:
+                return orjson.loads(view)
+
+
+def _dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    return json.dumps(obj, indent=2, ensure_ascii=False).encode('utf-8')
+
+
+def _dumps_line(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE)
+    return json.dumps(obj, ensure_ascii=False).encode('utf-8') + b"\n"
+
+
+def _fsync_dir(dir_path: Path):
+    """Persist renames in ``dir_path``; a no-op where directories cannot be opened (Windows)"""
+    try:
+        fd = os.open(dir_path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
 
 class StateManager:
-    """Manages shared state via JSON files"""
+    """Manages shared state via JSON files
+
+    Getters return parsed data shared with other callers in the process;
+    it must be treated as read-only.
+    """
     
     def __init__(self):
-        self._lock = threading.Lock()
+        self._legacy_stats: "OrderedDict[tuple, Dict[str, Dict[str, int]]]" = OrderedDict()
         self._initialize_files()
         self._editors: Dict[str, FileScopedEditor] = {}
     
@@ -39,51 +147,230 @@ class StateManager:
         
         # Initialize agent_registry.json
         if not AGENT_REGISTRY_FILE.exists():
+            _known_agents.clear()
             self._write_json(AGENT_REGISTRY_FILE, {})
     
-    def _read_json(self, file_path: Path) -> Dict[str, Any]:
-        """Safely read JSON file"""
-        with self._lock:
+    def _read_json(self, file_path: Path, snapshot: bool = False) -> Dict[str, Any]:
+        """Safely read JSON file
+
+        With ``snapshot=True`` the parsed content is reused while the file's
+        mtime and size are unchanged, and is shared between callers, so it
+        must only be read. Without it the caller gets a private copy it may
+        modify and write back.
+        """
+        if snapshot:
+            key = self._file_key(file_path)
+            if key is None:
+                return {}
+            cached = _snapshot_cache.get(file_path)
+            if cached is not None and cached[0] == key:
+                return cached[1]
+
+        with self._lock_for(file_path):
+            if snapshot:
+                # The file may have been rewritten while waiting for the lock
+                key = self._file_key(file_path)
+                if key is None:
+                    return {}
+
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except (FileNotFoundError, json.JSONDecodeError):
+                data = _load_file(file_path)
+            except (FileNotFoundError, ValueError):
                 return {}
+
+            if snapshot:
+                # Stat was taken first, so a concurrent write only makes the key stale
+                _snapshot_cache[file_path] = (key, data)
+            return data
     
     def _write_json(self, file_path: Path, data: Dict[str, Any]):
-        """Safely write JSON file"""
-        with self._lock:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
+        """Safely write JSON file
+
+        The data is written and fsynced to a temp file that then atomically
+        replaces the target, so a crash never leaves a truncated file. Only
+        the swap itself happens under the file lock. The written data becomes
+        the file's snapshot, so the caller must not modify it afterwards.
+        """
+        payload = _dumps(data)
+        tmp_path = file_path.with_name(f"{file_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+                # os.replace keeps the inode, so this is the target's key once swapped in
+                st = os.fstat(f.fileno())
+            key = (st.st_ino, st.st_mtime_ns, st.st_size)
+
+            with self._lock_for(file_path):
+                self._replace(tmp_path, file_path)
+                _snapshot_cache[file_path] = (key, data)
+                if file_path == CONVERSATIONS_FILE:
+                    self._index_conversations(data, key)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        _fsync_dir(file_path.parent)
+    
+    @staticmethod
+    def _replace(tmp_path: Path, file_path: Path):
+        for attempt in range(REPLACE_RETRIES):
+            try:
+                os.replace(tmp_path, file_path)
+                return
+            except PermissionError:
+                # Windows refuses to replace a file another process has open for reading
+                if attempt == REPLACE_RETRIES - 1:
+                    raise
+                time.sleep(0.01)
+    
+    @staticmethod
+    def _lock_for(file_path: Path) -> threading.RLock:
+        """Return the process-wide lock for a state file"""
+        lock = _file_locks.get(file_path)
+        if lock is None:
+            lock = _file_locks.setdefault(file_path, threading.RLock())
+        return lock
+    
+    @staticmethod
+    def _file_key(file_path: Path) -> Optional[Tuple[int, int, int]]:
+        """Identify a file version by (st_ino, st_mtime_ns, st_size), or None if missing"""
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+    
+    def _index_conversations(self, conversations: Dict[str, Any], key: Optional[Tuple[int, int, int]]):
+        """Rebuild the participant index from conversation data"""
+        by_agent: Dict[str, Dict[str, None]] = {}
+        by_participants: Dict[frozenset, str] = {}
+        for conv_id, conv_data in conversations.items():
+            participants = frozenset(conv_data.get("participants", []))
+            by_participants.setdefault(participants, conv_id)
+            for agent in participants:
+                by_agent.setdefault(agent, {})[conv_id] = None
+        _participant_indexes[CONVERSATIONS_FILE] = (key, by_agent, by_participants)
+    
+    def _participant_index(self) -> Tuple[Dict[str, Dict[str, None]], Dict[frozenset, str]]:
+        """Return the participant index, rebuilding it if another writer changed the file"""
+        key = self._file_key(CONVERSATIONS_FILE)
+        index = _participant_indexes.get(CONVERSATIONS_FILE)
+        if key is None or index is None or key != index[0]:
+            # Stat before reading: a concurrent write only makes the key stale, never the data
+            conversations = self._read_json(CONVERSATIONS_FILE, snapshot=True)
+            with self._lock_for(CONVERSATIONS_FILE):
+                self._index_conversations(conversations, key)
+            index = _participant_indexes[CONVERSATIONS_FILE]
+        return index[1], index[2]
     
     def register_agent(self, agent_id: str, agent_name: str, agent_type: str = "custom"):
         """Register a new agent"""
-        registry = self._read_json(AGENT_REGISTRY_FILE)
-        registry[agent_id] = {
-            "name": agent_name,
-            "type": agent_type,
-            "registered_at": datetime.now().isoformat(),
-            "last_active": datetime.now().isoformat(),
-            "status": "online"
-        }
-        self._write_json(AGENT_REGISTRY_FILE, registry)
+        now = datetime.now().isoformat()
+        with self._lock_for(AGENT_REGISTRY_FILE):
+            registry = self._read_json(AGENT_REGISTRY_FILE)
+            registry[agent_id] = {
+                "name": agent_name,
+                "type": agent_type,
+                "registered_at": now,
+                "last_active": now,
+                "status": "online"
+            }
+            self._write_json(AGENT_REGISTRY_FILE, registry)
+        _known_agents.add(agent_id)
+    
+    def ensure_agents_registered(self, agents: List[Tuple[str, str, str]]):
+        """Register every (agent_id, name, type) not yet in the registry, with one write"""
+        missing = [entry for entry in agents if entry[0] not in _known_agents]
+        if not missing:
+            return
+
+        now = datetime.now().isoformat()
+        with self._lock_for(AGENT_REGISTRY_FILE):
+            registry = self._read_json(AGENT_REGISTRY_FILE)
+            added = False
+            for agent_id, agent_name, agent_type in missing:
+                if agent_id not in registry:
+                    registry[agent_id] = {
+                        "name": agent_name,
+                        "type": agent_type,
+                        "registered_at": now,
+                        "last_active": now,
+                        "status": "online"
+                    }
+                    added = True
+            if added:
+                self._write_json(AGENT_REGISTRY_FILE, registry)
+        _known_agents.update(entry[0] for entry in missing)
     
     def get_agent_info(self, agent_id: str) -> Optional[Dict[str, Any]]:
         """Get agent information"""
-        registry = self._read_json(AGENT_REGISTRY_FILE)
+        self.flush()
+        registry = self._read_json(AGENT_REGISTRY_FILE, snapshot=True)
         return registry.get(agent_id)
     
+    def is_agent_registered(self, agent_id: str) -> bool:
+        """Check registration, answering from memory for agents already seen"""
+        if agent_id in _known_agents:
+            return True
+        if self.get_agent_info(agent_id) is None:
+            return False
+        _known_agents.add(agent_id)
+        return True
+    
     def get_all_agents(self) -> Dict[str, Any]:
         """Get all registered agents"""
-        return self._read_json(AGENT_REGISTRY_FILE)
+        self.flush()
+        return self._read_json(AGENT_REGISTRY_FILE, snapshot=True)
     
     def update_agent_activity(self, agent_id: str):
-        """Update agent's last activity time"""
-        registry = self._read_json(AGENT_REGISTRY_FILE)
-        if agent_id in registry:
-            registry[agent_id]["last_active"] = datetime.now().isoformat()
-            registry[agent_id]["status"] = "online"
-            self._write_json(AGENT_REGISTRY_FILE, registry)
+        """Update agent's last activity time
+
+        The update is buffered; a short-lived thread writes every update made
+        within ACTIVITY_FLUSH_DELAY to the registry at once. Updates within
+        ACTIVITY_DEBOUNCE_INTERVAL of the agent's previous one are skipped.
+        """
+        global _activity_flush_scheduled
+        now = time.monotonic()
+        with _activity_buffer_lock:
+            if now - _last_activity.get(agent_id, float("-inf")) < ACTIVITY_DEBOUNCE_INTERVAL:
+                return
+            _last_activity[agent_id] = now
+            _activity_buffer[agent_id] = datetime.now().isoformat()
+            if _activity_flush_scheduled:
+                return
+            _activity_flush_scheduled = True
+        # Not a daemon, so buffered updates are still written if the process exits
+        threading.Thread(target=self._flush_after_delay, name="state-activity-flush").start()
+
+    def _flush_after_delay(self):
+        global _activity_flush_scheduled
+        time.sleep(ACTIVITY_FLUSH_DELAY)
+        with _activity_buffer_lock:
+            _activity_flush_scheduled = False
+        self.flush()
+
+    def flush(self):
+        """Write buffered activity updates to the agent registry"""
+        if not _activity_buffer:
+            return
+        with self._lock_for(AGENT_REGISTRY_FILE):
+            # Taken under the file lock so an older batch never overwrites a newer one
+            with _activity_buffer_lock:
+                batch = dict(_activity_buffer)
+                _activity_buffer.clear()
+            if not batch:
+                return
+
+            registry = self._read_json(AGENT_REGISTRY_FILE)
+            changed = False
+            for agent_id, last_active in batch.items():
+                if agent_id in registry:
+                    registry[agent_id]["last_active"] = last_active
+                    registry[agent_id]["status"] = "online"
+                    changed = True
+            if changed:
+                self._write_json(AGENT_REGISTRY_FILE, registry)
 
     def bind_editor(self, agent_id: str, editor: FileScopedEditor) -> None:
         """Bind a file-scoped editor to an agent."""
@@ -107,114 +394,517 @@ class StateManager:
         if isinstance(participants, str):
             participants = [participants]
 
-        pending = self._read_json(PENDING_CALLS_FILE)
-        call_id = f"call_{int(time.time()*1000)}"
-        pending[call_id] = {
-            "participants": list(participants),
-            "message": message,
-            "timestamp": datetime.now().isoformat(),
-            "waiting": True
-        }
-        self._write_json(PENDING_CALLS_FILE, pending)
+        with self._lock_for(PENDING_CALLS_FILE):
+            pending = self._read_json(PENDING_CALLS_FILE)
+            call_id = f"call_{int(time.time()*1000)}"
+            # Two calls in the same millisecond must not overwrite each other
+            suffix = 1
+            while call_id in pending:
+                suffix += 1
+                call_id = f"call_{int(time.time()*1000)}_{suffix}"
+            pending[call_id] = {
+                "participants": list(participants),
+                "message": message,
+                "timestamp": datetime.now().isoformat(),
+                "waiting": True
+            }
+            self._write_json(PENDING_CALLS_FILE, pending)
         return call_id
 
     def remove_pending_call(self, call_id: str):
         """Remove pending tool call by call ID"""
-        pending = self._read_json(PENDING_CALLS_FILE)
-        if call_id in pending:
-            del pending[call_id]
-            self._write_json(PENDING_CALLS_FILE, pending)
+        with self._lock_for(PENDING_CALLS_FILE):
+            pending = self._read_json(PENDING_CALLS_FILE)
+            if call_id in pending:
+                del pending[call_id]
+                self._write_json(PENDING_CALLS_FILE, pending)
+
+    @contextmanager
+    def pending_call(self, participants: List[str] | str, message: str = None) -> Iterator[str]:
+        """Track a pending tool call for the duration of a ``with`` block.
+
+        The call is recorded on entry and removed on exit, including when
+        the block raises.
+
+        Yields:
+            The call ID.
+        """
+        call_id = self.add_pending_call(participants, message)
+        try:
+            yield call_id
+        finally:
+            self.remove_pending_call(call_id)
     
+    def snapshot(self) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]:
+        """Return (agents, pending_calls, conversations) in one call
+
+        Buffered activity is flushed once, then each file comes from the
+        snapshot cache, so unchanged files cost a stat rather than a parse.
+        """
+        self.flush()
+        return (
+            self._read_json(AGENT_REGISTRY_FILE, snapshot=True),
+            self._read_json(PENDING_CALLS_FILE, snapshot=True),
+            self._read_json(CONVERSATIONS_FILE, snapshot=True),
+        )
+
     def get_pending_calls(self) -> Dict[str, Any]:
         """Get all pending calls"""
-        return self._read_json(PENDING_CALLS_FILE)
+        return self._read_json(PENDING_CALLS_FILE, snapshot=True)
     
     def create_conversation(self, participants: List[str]) -> str:
         """Create new conversation between agents"""
-        conv_id = f"{'_'.join(sorted(participants))}_{int(time.time())}"
-        conversations = self._read_json(CONVERSATIONS_FILE)
+        with self._lock_for(CONVERSATIONS_FILE):
+            conversations = self._read_json(CONVERSATIONS_FILE)
+            conv_id = self._new_conversation(conversations, participants, datetime.now().isoformat())
+            self._write_json(CONVERSATIONS_FILE, conversations)
+        return conv_id
+
+    def add_message(self, conv_id: str, from_agent: str, message: str, priority: int = 0) -> str:
+        """Add message to conversation and broadcast to all participants
+
+        Messages with a higher ``priority`` are handed out before older,
+        lower-priority ones by get_pending_messages_for_agent.
+        """
+        now = datetime.now().isoformat()
+        with self._lock_for(CONVERSATIONS_FILE):
+            conversations = self._read_json(CONVERSATIONS_FILE)
+
+            if conv_id not in conversations:
+                raise ValueError(f"Conversation {conv_id} not found")
+
+            msg_id, archived = self._append_message(conversations, conv_id, from_agent, message, priority, now)
+            self._write_json(CONVERSATIONS_FILE, conversations)
+            self._archive_messages(conv_id, archived)
 
+        self._notify_message()
+        return msg_id
+
+    def post_message(self, participants: List[str], from_agent: str, message: str,
+                     priority: int = 0) -> Tuple[str, str]:
+        """Add a message to the participants' conversation, creating it if needed.
+
+        Does the find, create and append in a single read and write of
+        conversations.json.
+
+        Returns:
+            Tuple of (conversation ID, message ID).
+        """
+        now = datetime.now().isoformat()
+        with self._lock_for(CONVERSATIONS_FILE):
+            conversations = self._read_json(CONVERSATIONS_FILE)
+
+            conv_id = self.find_conversation(participants)
+            if conv_id not in conversations:
+                conv_id = self._new_conversation(conversations, participants, now)
+
+            msg_id, archived = self._append_message(conversations, conv_id, from_agent, message, priority, now)
+            self._write_json(CONVERSATIONS_FILE, conversations)
+            self._archive_messages(conv_id, archived)
+
+        self._notify_message()
+        return conv_id, msg_id
+
+    @staticmethod
+    def _new_conversation(conversations: Dict[str, Any], participants: List[str], now: str) -> str:
+        """Add an empty conversation to ``conversations`` and return its ID"""
+        conv_id = f"{'_'.join(sorted(participants))}_{int(time.time())}"
         conversations[conv_id] = {
             "participants": list(participants),
-            "created_at": datetime.now().isoformat(),
-            "last_update": datetime.now().isoformat(),
+            "created_at": now,
+            "last_update": now,
             "message_count": 0,
-            "messages": []
+            "messages": [],
+            "stats": {"sent": {}, "received": {}, "pending": {}},
+            "inbox": {}
         }
-
-        self._write_json(CONVERSATIONS_FILE, conversations)
         return conv_id
 
-    def add_message(self, conv_id: str, from_agent: str, message: str) -> str:
-        """Add message to conversation and broadcast to all participants"""
-        conversations = self._read_json(CONVERSATIONS_FILE)
+    def _append_message(self, conversations: Dict[str, Any], conv_id: str, from_agent: str,
+                        message: str, priority: int, now: str) -> Tuple[str, List[Dict[str, Any]]]:
+        """Append a message to a conversation in ``conversations``
 
-        if conv_id not in conversations:
-            raise ValueError(f"Conversation {conv_id} not found")
+        Returns:
+            Tuple of (message ID, messages trimmed from the conversation that
+            the caller must archive once the conversation is written).
 
-        participants = conversations[conv_id]["participants"]
+        Raises:
+            ValueError: A recipient already has MAX_PENDING_PER_AGENT
+                undelivered messages in the conversation.
+        """
+        conversation = conversations[conv_id]
+        participants = conversation["participants"]
         recipients = [p for p in participants if p != from_agent]
 
-        msg_id = f"msg_{len(conversations[conv_id]['messages']) + 1}"
+        # Per-recipient IDs of pending messages, built on first use for older conversations
+        inbox = conversation.get("inbox")
+        if inbox is None:
+            inbox = conversation["inbox"] = self._compute_inbox(conversation)
+        full = [r for r in recipients if len(inbox.get(r, ())) >= MAX_PENDING_PER_AGENT]
+        if full:
+            raise ValueError(
+                f"{', '.join(full)} already has {MAX_PENDING_PER_AGENT} undelivered "
+                f"messages in {conv_id}; wait until they are read"
+            )
+
+        # message_count keeps counting after old messages are archived
+        msg_id = f"msg_{conversation['message_count'] + 1}"
         new_message = {
             "id": msg_id,
             "from": from_agent,
             "content": message,
-            "timestamp": datetime.now().isoformat(),
-            "status": {recipient: MESSAGE_STATUS["PENDING"] for recipient in recipients}
+            "timestamp": now,
+            "status": {recipient: _PENDING for recipient in recipients}
         }
+        if priority:
+            new_message["priority"] = priority
 
-        conversations[conv_id]["messages"].append(new_message)
-        conversations[conv_id]["message_count"] += 1
-        conversations[conv_id]["last_update"] = datetime.now().isoformat()
+        conversation["messages"].append(new_message)
+        conversation["message_count"] += 1
+        conversation["last_update"] = now
 
-        self._write_json(CONVERSATIONS_FILE, conversations)
-        return msg_id
+        # Keep per-agent counters current so readers never rescan messages
+        stats = conversation.get("stats")
+        if stats is None:
+            conversation["stats"] = self._compute_stats(conversation)
+        else:
+            stats["sent"][from_agent] = stats["sent"].get(from_agent, 0) + 1
+            for recipient in recipients:
+                stats["received"][recipient] = stats["received"].get(recipient, 0) + 1
+                stats["pending"][recipient] = stats["pending"].get(recipient, 0) + 1
+
+        for recipient in recipients:
+            inbox.setdefault(recipient, []).append(msg_id)
+
+        return msg_id, self._trim_conversation(conv_id, conversation)
+
+    @staticmethod
+    def _notify_message():
+        """Wake threads in wait_for_pending_messages"""
+        global _message_generation
+        with _message_condition:
+            _message_generation += 1
+            _message_condition.notify_all()
+
+    def _trim_conversation(self, conv_id: str, conversation: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Remove and return the oldest half of a conversation past MAX_MESSAGES_PER_CONVERSATION"""
+        messages = conversation["messages"]
+        if len(messages) <= MAX_MESSAGES_PER_CONVERSATION:
+            return []
+
+        archived = messages[:len(messages) // 2]
+        archived_pending: Dict[str, List[str]] = {}
+        for message in archived:
+            for agent, state in message.get("status", {}).items():
+                if state == _PENDING:
+                    archived_pending.setdefault(agent, []).append(message["id"])
+        for agent, message_ids in archived_pending.items():
+            logger.warning(
+                "Dropping %d undelivered message(s) for %s in %s: archived",
+                len(message_ids), agent, conv_id
+            )
+            self._drop_pending(conversation, agent, message_ids)
+
+        del messages[:len(archived)]
+        return archived
+
+    @staticmethod
+    def _archive_messages(conv_id: str, archived: List[Dict[str, Any]]):
+        """Append trimmed messages to the conversation's archive
+
+        Called after conversations.json is replaced, so a failed state write
+        never leaves live messages in the archive.
+        """
+        if not archived:
+            return
+        try:
+            ARCHIVE_DIR.mkdir(exist_ok=True)
+            with open(ARCHIVE_DIR / f"{conv_id}.jsonl", 'ab') as f:
+                f.write(b"".join(_dumps_line(m) for m in archived))
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError:
+            # The message itself is already stored; report the lost history instead of failing it
+            logger.exception("Could not archive %d message(s) trimmed from %s", len(archived), conv_id)
+
+    def _drop_pending(self, conversation: Dict[str, Any], agent_id: str, message_ids: List[str]):
+        """Mark pending messages of an agent as dropped and take them out of its inbox"""
+        dropped = set(message_ids)
+        for message_id in message_ids:
+            message = self._find_message(conversation["messages"], message_id)
+            if message is not None:
+                message["status"][agent_id] = _DROPPED
+
+        inbox = conversation["inbox"]
+        remaining = [m for m in inbox.get(agent_id, ()) if m not in dropped]
+        if remaining:
+            inbox[agent_id] = remaining
+        else:
+            inbox.pop(agent_id, None)
+
+        pending = conversation["stats"]["pending"]
+        pending[agent_id] = max(pending.get(agent_id, 0) - len(dropped), 0)
+        conversation["status_version"] = conversation.get("status_version", 0) + 1
     
     def get_conversation(self, conv_id: str) -> Optional[Dict[str, Any]]:
         """Get specific conversation"""
-        conversations = self._read_json(CONVERSATIONS_FILE)
+        conversations = self._read_json(CONVERSATIONS_FILE, snapshot=True)
         return conversations.get(conv_id)
     
     def get_all_conversations(self) -> Dict[str, Any]:
         """Get all conversations"""
-        return self._read_json(CONVERSATIONS_FILE)
+        return self._read_json(CONVERSATIONS_FILE, snapshot=True)
     
     def get_pending_messages_for_agent(self, agent_id: str) -> List[Dict[str, Any]]:
-        """Get all pending messages for specific agent"""
-        conversations = self._read_json(CONVERSATIONS_FILE)
+        """Get all pending messages for specific agent
+
+        Higher-priority messages come first; otherwise conversation order is kept.
+        """
+        conversations = self._read_json(CONVERSATIONS_FILE, snapshot=True)
         pending_messages = []
+        extend = pending_messages.extend
+        prioritized = False
 
-        for conv_id, conv_data in conversations.items():
-            for message in conv_data["messages"]:
-                status = message.get("status", {})
-                if status.get(agent_id) == MESSAGE_STATUS["PENDING"]:
-                    pending_messages.append({
+        # Only the agent's own conversations; the inbox names their pending
+        # messages directly
+        for conv_id in self._participant_index()[0].get(agent_id, ()):
+            conv_data = conversations.get(conv_id)
+            if conv_data is None:
+                continue
+
+            inbox = conv_data.get("inbox")
+            if inbox is not None:
+                messages = conv_data["messages"]
+                for message_id in inbox.get(agent_id, ()):
+                    message = self._find_message(messages, message_id)
+                    if message is not None:
+                        prioritized = prioritized or "priority" in message
+                        pending_messages.append({
+                            "conversation_id": conv_id,
+                            "message": message
+                        })
+                continue
+
+            # Conversations written before the inbox existed: use the counter and
+            # walk from the newest message back until all pending ones are found
+            remaining = self.get_conversation_stats(conv_data, conv_id)["pending"].get(agent_id, 0)
+            if not remaining:
+                continue
+
+            found = []
+            for message in reversed(conv_data["messages"]):
+                status = message.get("status")
+                if status and status.get(agent_id) == _PENDING:
+                    prioritized = prioritized or "priority" in message
+                    found.append({
                         "conversation_id": conv_id,
                         "message": message
                     })
+                    remaining -= 1
+                    if not remaining:
+                        break
+            found.reverse()
+            extend(found)
 
+        if prioritized:
+            # Stable, so equal priorities keep their order
+            pending_messages.sort(key=lambda item: -item["message"].get("priority", 0))
         return pending_messages
     
+    def wait_for_pending_messages(self, agent_id: str, timeout: float) -> List[Dict[str, Any]]:
+        """Return the agent's pending messages, waiting up to ``timeout`` seconds for one.
+
+        Messages added in this process wake the wait immediately; messages
+        from other processes are noticed within MESSAGE_POLL_INTERVAL.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            with _message_condition:
+                generation = _message_generation
+            pending = self.get_pending_messages_for_agent(agent_id)
+            remaining = deadline - time.monotonic()
+            if pending or remaining <= 0:
+                return pending
+            with _message_condition:
+                # Skip the wait if a message arrived while the file was being checked
+                if _message_generation == generation:
+                    _message_condition.wait(min(remaining, MESSAGE_POLL_INTERVAL))
+    
     def mark_message_delivered(self, conv_id: str, message_id: str, agent_id: str):
         """Mark message as delivered for a specific agent"""
-        conversations = self._read_json(CONVERSATIONS_FILE)
+        self.mark_messages_delivered({conv_id: [message_id]}, agent_id)
 
-        if conv_id in conversations:
-            for message in conversations[conv_id]["messages"]:
-                if message["id"] == message_id:
-                    if agent_id in message.get("status", {}):
-                        message["status"][agent_id] = MESSAGE_STATUS["DELIVERED"]
-                    break
+    def mark_messages_delivered(self, message_ids: Dict[str, List[str]], agent_id: str):
+        """Mark several messages as delivered for an agent with a single write.
 
-            self._write_json(CONVERSATIONS_FILE, conversations)
+        Args:
+            message_ids: Mapping of conversation ID to the IDs of its
+                messages to mark.
+            agent_id: Recipient the messages were delivered to.
+        """
+        with self._lock_for(CONVERSATIONS_FILE):
+            conversations = self._read_json(CONVERSATIONS_FILE)
+            changed = False
 
-    def find_conversation(self, participants: Iterable[str]) -> Optional[str]:
-        """Find existing conversation by participant set"""
-        participant_set = set(participants)
-        conversations = self._read_json(CONVERSATIONS_FILE)
+            for conv_id, conv_message_ids in message_ids.items():
+                conversation = conversations.get(conv_id)
+                if conversation is None:
+                    continue
 
-        for conv_id, conv_data in conversations.items():
-            if set(conv_data.get("participants", [])) == participant_set:
-                return conv_id
+                marked = delivered = 0
+                for message_id in conv_message_ids:
+                    message = self._find_message(conversation["messages"], message_id)
+                    if message is None:
+                        continue
+                    status = message.get("status", {})
+                    if status.get(agent_id, _DELIVERED) == _DELIVERED:
+                        # Unknown recipient or already delivered: nothing to change
+                        continue
+                    if status[agent_id] == _PENDING:
+                        delivered += 1
+                        inbox_ids = conversation.get("inbox", {}).get(agent_id)
+                        if inbox_ids and message_id in inbox_ids:
+                            inbox_ids.remove(message_id)
+                            if not inbox_ids:
+                                del conversation["inbox"][agent_id]
+                    status[agent_id] = _DELIVERED
+                    # Lets readers detect status-only changes without rescanning messages
+                    conversation["status_version"] = conversation.get("status_version", 0) + 1
+                    marked += 1
+                if not marked:
+                    continue
+                changed = True
+
+                stats = conversation.get("stats")
+                if stats is None:
+                    conversation["stats"] = self._compute_stats(conversation)
+                elif delivered:
+                    stats["pending"][agent_id] = max(stats["pending"].get(agent_id, 0) - delivered, 0)
+
+            if changed:
+                self._write_json(CONVERSATIONS_FILE, conversations)
+
+    @staticmethod
+    def _find_message(messages: List[Dict[str, Any]], message_id: str) -> Optional[Dict[str, Any]]:
+        """Locate a message by ID
+
+        add_message numbers messages msg_1, msg_2, ... in list order, so the
+        ID's distance from the first kept message gives the position directly;
+        other IDs fall back to a scan.
+        """
+        prefix, _, number = message_id.partition("_")
+        if prefix == "msg" and number.isdecimal() and messages:
+            first_prefix, _, first_number = messages[0].get("id", "").partition("_")
+            if first_prefix == "msg" and first_number.isdecimal():
+                position = int(number) - int(first_number)
+                if 0 <= position < len(messages) and messages[position].get("id") == message_id:
+                    return messages[position]
+        for message in messages:
+            if message.get("id") == message_id:
+                return message
         return None
+
+    @staticmethod
+    def _compute_stats(conv_data: Dict[str, Any]) -> Dict[str, Dict[str, int]]:
+        """Build per-agent sent/received/pending counters from a conversation's messages"""
+        sent: Dict[str, int] = {}
+        received: Dict[str, int] = {}
+        pending: Dict[str, int] = {}
+
+        for message in conv_data.get("messages", []):
+            sender = message.get("from")
+            sent[sender] = sent.get(sender, 0) + 1
+            for agent, state in message.get("status", {}).items():
+                received[agent] = received.get(agent, 0) + 1
+                if state == _PENDING:
+                    pending[agent] = pending.get(agent, 0) + 1
+
+        return {"sent": sent, "received": received, "pending": pending}
+
+    @staticmethod
+    def _compute_inbox(conv_data: Dict[str, Any]) -> Dict[str, List[str]]:
+        """Build the per-recipient list of pending message IDs from a conversation's messages"""
+        inbox: Dict[str, List[str]] = {}
+        for message in conv_data.get("messages", []):
+            for agent, state in message.get("status", {}).items():
+                if state == _PENDING:
+                    inbox.setdefault(agent, []).append(message["id"])
+        return inbox
+
+    def get_conversation_stats(self, conv_data: Dict[str, Any],
+                               conv_id: Optional[str] = None) -> Dict[str, Dict[str, int]]:
+        """Return the stored counters of a conversation, computing them for legacy data.
+
+        Computed counters are remembered per ``conv_id`` until the conversation
+        changes, so legacy conversations are scanned once rather than per call.
+        """
+        stats = conv_data.get("stats")
+        if stats is not None:
+            return stats
+        if conv_id is None:
+            return self._compute_stats(conv_data)
+
+        key = (
+            conv_id,
+            conv_data.get("last_update"),
+            conv_data.get("message_count", 0),
+            conv_data.get("status_version", 0),
+        )
+        stats = self._legacy_stats.get(key)
+        if stats is None:
+            stats = self._compute_stats(conv_data)
+            self._legacy_stats[key] = stats
+            if len(self._legacy_stats) > LEGACY_STATS_CACHE_SIZE:
+                self._legacy_stats.popitem(last=False)
+        else:
+            self._legacy_stats.move_to_end(key)
+        return stats
+
+    def get_message_count_batch(self, agent_id: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """Get message counters for every conversation in one call.
+
+        Args:
+            agent_id: If given, only conversations including this agent are
+                returned and the counters are specific to that agent.
+                Otherwise counters are totals across all participants.
+
+        Returns:
+            Mapping of conversation ID to ``participants``, ``sent``,
+            ``received``, ``pending``, ``message_count`` and ``last_update``.
+        """
+        conversations = self._read_json(CONVERSATIONS_FILE, snapshot=True)
+        if agent_id is None:
+            conv_ids = list(conversations)
+        else:
+            conv_ids = list(self._participant_index()[0].get(agent_id, ()))
+        batch = {}
+
+        for conv_id in conv_ids:
+            conv_data = conversations.get(conv_id)
+            if conv_data is None:
+                continue
+            participants = conv_data.get("participants", [])
+            if agent_id is not None and agent_id not in participants:
+                continue
+
+            stats = self.get_conversation_stats(conv_data, conv_id)
+            if agent_id is None:
+                counts = {key: sum(stats[key].values()) for key in ("sent", "received", "pending")}
+            else:
+                counts = {key: stats[key].get(agent_id, 0) for key in ("sent", "received", "pending")}
+
+            batch[conv_id] = {
+                "participants": participants,
+                "message_count": conv_data.get("message_count", 0),
+                "last_update": conv_data.get("last_update"),
+                **counts
+            }
+
+        return batch
+
+    def find_conversation(self, participants: Iterable[str]) -> Optional[str]:
+        """Find existing conversation by participant set"""
+        participant_set = frozenset(participants)
+        if not participant_set:
+            return None
+        return self._participant_index()[1].get(participant_set)
@@ -2,210 +2,254 @@
 Main Engine for Agent Communication MCP Tool
 """
 
+import asyncio
+import functools
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from typing import Optional, Dict, Any
 
 from .core.state_manager import StateManager
 from .core.message_handler import MessageHandler
 from .ui.controller_ui import show_controller_ui
 
+# Shared by every tool call in the process instead of being rebuilt per call
+_state_manager: Optional[StateManager] = None
+_message_handler: Optional[MessageHandler] = None
+_singleton_lock = threading.Lock()
 
+# Fixed part of the agent_comm_status report
+_STATUS_HEADER = (
+    "=== Agent Communication System Status ===\n"
+    "Total Agents: {na}\n"
+    "Pending Tool Calls: {np}\n"
+    "Total Conversations: {nc}\n"
+)
+
+
+def _get_state_manager() -> StateManager:
+    """Return the shared StateManager, creating it on first use"""
+    global _state_manager
+    if _state_manager is None:
+        with _singleton_lock:
+            if _state_manager is None:
+                _state_manager = StateManager()
+    return _state_manager
+
+
+def _get_message_handler() -> MessageHandler:
+    """Return the shared MessageHandler, creating it on first use"""
+    global _message_handler
+    if _message_handler is None:
+        with _singleton_lock:
+            if _message_handler is None:
+                _message_handler = MessageHandler()
+    return _message_handler
+
+
+def _error_message(prefix: str):
+    """Make a tool function return "<prefix>: <error>" instead of raising"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                return f"{prefix}: {e}"
+        return wrapper
+    return decorator
+
+
+# Runs the blocking entry points for the async variants below, so an asyncio
+# server's event loop never waits on state file I/O. Only entry points that
+# never open the controller UI go here; Qt dialogs need the main thread
+_tool_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_tool_executor() -> ThreadPoolExecutor:
+    """Return the shared executor for async entry points, creating it on first use"""
+    global _tool_executor
+    if _tool_executor is None:
+        with _singleton_lock:
+            if _tool_executor is None:
+                _tool_executor = ThreadPoolExecutor(thread_name_prefix="agent-comm")
+    return _tool_executor
+
+
+async def _run_blocking(func, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_tool_executor(), functools.partial(func, *args))
+
+
+@_error_message("Error in agent communication tool")
 def run_agent_comm():
     """
     Main entry point for agent communication tool
     This function will be called by MCP server
     """
-    try:
-        # Parse command line arguments if any
-        args = sys.argv[1:] if len(sys.argv) > 1 else []
-        
-        # Default parameters
-        agent_id = None
-        message = None
-        action = "communicate"
-        
-        # Parse arguments (simple format for now)
-        # Expected format: agent_id [message] [action]
-        if args:
-            agent_id = args[0]
-            if len(args) > 1:
-                message = args[1]
-            if len(args) > 2:
-                action = args[2]
-        
-        # Process based on action
-        if action == "send_message":
-            return handle_send_message(agent_id, message)
-        elif action == "check_messages":
-            return handle_check_messages(agent_id)
-        else:
-            # Default: show UI for interactive communication
-            return handle_interactive_communication(agent_id, message)
+    # Parse arguments (simple format for now)
+    # Expected format: agent_id [message] [action] [to_agent]; missing ones take the defaults
+    args = sys.argv[1:5]
+    agent_id, message, action, to_agent = args + [None, None, "communicate", None][len(args):]
     
-    except Exception as e:
-        return f"Error in agent communication tool: {str(e)}"
+    # Process based on action; default: show UI for interactive communication
+    handler = _ACTION_DISPATCH.get(action, _ACTION_DISPATCH["communicate"])
+    return handler(agent_id, message, to_agent)
 
 
-def handle_send_message(from_agent: str, message: str) -> str:
+@_error_message("Error sending message")
+def handle_send_message(from_agent: str, message: str, to_agent: str = None) -> str:
     """Handle sending a message"""
-    try:
-        if not from_agent or not message:
-            return "Error: Agent ID and message are required for sending"
-        
-        message_handler = MessageHandler()
-        
-        # Parse agent info
-        from_agent_id, from_agent_name, from_agent_type = message_handler.parse_agent_id(from_agent)
-        
-        # Add to pending calls (waiting for user to route)
-        state_manager = StateManager()
-        call_id = state_manager.add_pending_call([from_agent_id], message)
-        
+    if not from_agent or not message:
+        return "Error: Agent ID and message are required for sending"
+    
+    # Target already known: send directly without asking the user to route it
+    if to_agent:
+        return agent_comm_send(from_agent, to_agent, message)
+    
+    message_handler = _get_message_handler()
+    
+    # Parse agent info
+    from_agent_id, from_agent_name, from_agent_type = message_handler.parse_agent_id(from_agent)
+    
+    # Pending (waiting for user to route) until the UI returns, even if it fails
+    state_manager = _get_state_manager()
+    with state_manager.pending_call([from_agent_id], message):
         # Show UI to let user choose target
         target_agent = show_controller_ui()
-        
-        if target_agent:
-            # Send message to target
-            success, result = message_handler.send_message(
-                from_agent_id, target_agent, message, 
-                from_agent_name, from_agent_type
-            )
-            
-            # Remove from pending calls
-            state_manager.remove_pending_call(call_id)
-            
-            return result
-        else:
-            # Remove from pending calls if cancelled
-            state_manager.remove_pending_call(call_id)
-            return "Message sending cancelled by user"
-    
-    except Exception as e:
-        return f"Error sending message: {str(e)}"
-
-
-def handle_check_messages(agent_id: str) -> str:
-    """Handle checking for messages"""
-    try:
-        if not agent_id:
-            return "Error: Agent ID is required for checking messages"
-        
-        message_handler = MessageHandler()
-        
-        # Parse agent info
-        agent_id_parsed, agent_name, agent_type = message_handler.parse_agent_id(agent_id)
-        
-        # Check for messages
-        success, result = message_handler.check_messages(agent_id_parsed, agent_name, agent_type)
-        
+    
+    if target_agent:
+        # Send message to target
+        success, result = message_handler.send_message(
+            from_agent_id, target_agent, message, 
+            from_agent_name, from_agent_type
+        )
         return result
+    else:
+        return "Message sending cancelled by user"
+
+
+@_error_message("Error checking messages")
+def handle_check_messages(agent_id: str, wait: float = 0) -> str:
+    """Handle checking for messages
+
+    With ``wait`` > 0, waits up to that many seconds for a message to arrive.
+    """
+    if not agent_id:
+        return "Error: Agent ID is required for checking messages"
     
-    except Exception as e:
-        return f"Error checking messages: {str(e)}"
+    message_handler = _get_message_handler()
+    
+    # Parse agent info
+    agent_id_parsed, agent_name, agent_type = message_handler.parse_agent_id(agent_id)
+    
+    # Check for messages
+    success, result = message_handler.check_messages(agent_id_parsed, agent_name, agent_type, wait)
+    
+    return result
 
 
+@_error_message("Error in interactive communication")
 def handle_interactive_communication(agent_id: str = None, message: str = None) -> str:
     """Handle interactive communication via UI"""
-    try:
-        state_manager = StateManager()
-        
-        # Add to pending calls if agent provided
-        call_id = None
-        if agent_id:
-            call_id = state_manager.add_pending_call([agent_id], message)
-        
+    state_manager = _get_state_manager()
+    
+    # Pending while the UI is open, if agent provided
+    pending = state_manager.pending_call([agent_id], message) if agent_id else nullcontext()
+    with pending:
         # Show UI
         target_agent = show_controller_ui()
+    
+    if target_agent and agent_id and message:
+        # Send message
+        message_handler = _get_message_handler()
+        agent_id_parsed, agent_name, agent_type = message_handler.parse_agent_id(agent_id)
         
-        if target_agent and agent_id and message:
-            # Send message
-            message_handler = MessageHandler()
-            agent_id_parsed, agent_name, agent_type = message_handler.parse_agent_id(agent_id)
-            
-            success, result = message_handler.send_message(
-                agent_id_parsed, target_agent, message,
-                agent_name, agent_type
-            )
-            
-            # Remove from pending calls
-            if call_id:
-                state_manager.remove_pending_call(call_id)
-            
-            return result
-        else:
-            # Just show UI for monitoring
-            if call_id:
-                state_manager.remove_pending_call(call_id)
-            return "Agent Communication UI closed"
-    
-    except Exception as e:
-        return f"Error in interactive communication: {str(e)}"
+        success, result = message_handler.send_message(
+            agent_id_parsed, target_agent, message,
+            agent_name, agent_type
+        )
+        return result
+    else:
+        # Just show UI for monitoring
+        return "Agent Communication UI closed"
 
 
 # Alternative function signatures for flexibility
+@_error_message("Error in direct send")
 def agent_comm_send(from_agent: str, to_agent: str, message: str) -> str:
     """Send message directly between agents"""
-    try:
-        message_handler = MessageHandler()
-        
-        # Parse agent info
-        from_agent_id, from_agent_name, from_agent_type = message_handler.parse_agent_id(from_agent)
-        to_agent_id, _, _ = message_handler.parse_agent_id(to_agent)
-        
-        success, result = message_handler.send_message(
-            from_agent_id, to_agent_id, message,
-            from_agent_name, from_agent_type
-        )
-        
-        return result
+    message_handler = _get_message_handler()
+    
+    # Parse agent info
+    from_agent_id, from_agent_name, from_agent_type = message_handler.parse_agent_id(from_agent)
+    to_agent_id, _, _ = message_handler.parse_agent_id(to_agent)
+    
+    success, result = message_handler.send_message(
+        from_agent_id, to_agent_id, message,
+        from_agent_name, from_agent_type
+    )
     
-    except Exception as e:
-        return f"Error in direct send: {str(e)}"
+    return result
 
 
-def agent_comm_check(agent_id: str) -> str:
-    """Check messages for agent"""
-    return handle_check_messages(agent_id)
+def agent_comm_check(agent_id: str, wait: float = 0) -> str:
+    """Check messages for agent, waiting up to ``wait`` seconds for one"""
+    return handle_check_messages(agent_id, wait)
 
 
+@_error_message("Error getting status")
 def agent_comm_status() -> str:
     """Get system status"""
-    try:
-        state_manager = StateManager()
-        message_handler = MessageHandler()
-        
-        # Get system info
-        agents = state_manager.get_all_agents()
-        pending_calls = state_manager.get_pending_calls()
-        conversations = state_manager.get_all_conversations()
-        
-        # Format status
-        status_lines = [
-            "=== Agent Communication System Status ===",
-            f"Total Agents: {len(agents)}",
-            f"Pending Tool Calls: {len(pending_calls)}",
-            f"Total Conversations: {len(conversations)}",
-            ""
-        ]
-        
-        if agents:
-            status_lines.append("Registered Agents:")
-            for agent_id, info in agents.items():
-                status = info.get("status", "unknown")
-                agent_type = info.get("type", "unknown")
-                status_lines.append(f"  • {agent_id} ({agent_type}) - {status}")
-            status_lines.append("")
-        
-        if pending_calls:
-            status_lines.append("Pending Tool Calls:")
-            for agent_id, call_info in pending_calls.items():
-                timestamp = call_info.get("timestamp", "unknown")
-                status_lines.append(f"  • {agent_id} - {timestamp}")
-        
-        return "\n".join(status_lines)
+    state_manager = _get_state_manager()
     
-    except Exception as e:
-        return f"Error getting status: {str(e)}"
+    # Get system info
+    agents, pending_calls, conversations = state_manager.snapshot()
+    
+    # Format status; the header ends in a newline, which leaves a blank line after it
+    status_lines = [_STATUS_HEADER.format(na=len(agents), np=len(pending_calls), nc=len(conversations))]
+    
+    if agents:
+        status_lines.append("Registered Agents:")
+        status_lines.extend(
+            f"  • {agent_id} ({info.get('type', 'unknown')}) - {info.get('status', 'unknown')}"
+            for agent_id, info in agents.items()
+        )
+        status_lines.append("")
+    
+    if pending_calls:
+        status_lines.append("Pending Tool Calls:")
+        status_lines.extend(
+            f"  • {call_id} - {call_info.get('timestamp', 'unknown')}"
+            for call_id, call_info in pending_calls.items()
+        )
+    
+    return "\n".join(status_lines)
+
+
+# Async variants for asyncio-based MCP servers; same arguments and results
+async def agent_comm_send_async(from_agent: str, to_agent: str, message: str) -> str:
+    """Async form of agent_comm_send"""
+    return await _run_blocking(agent_comm_send, from_agent, to_agent, message)
+
+
+async def agent_comm_check_async(agent_id: str, wait: float = 0) -> str:
+    """Async form of agent_comm_check"""
+    return await _run_blocking(agent_comm_check, agent_id, wait)
+
+
+async def agent_comm_status_async() -> str:
+    """Async form of agent_comm_status"""
+    return await _run_blocking(agent_comm_status)
+
+
+# run_agent_comm actions, each called as handler(agent_id, message, to_agent)
+_ACTION_DISPATCH = {
+    "send_message": handle_send_message,
+    "check_messages": lambda agent_id, message, to_agent: handle_check_messages(agent_id),
+    "communicate": lambda agent_id, message, to_agent: handle_interactive_communication(agent_id, message),
+}
 
 
 # Main execution for testing